@@ -1,69 +1,108 @@
 import requests
 import datetime
+import logging
+import asyncio
+import aiohttp
+import os
+import csv
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import timed, record_upstream_error, record_cache_lookup, record_budget_exhausted
+from app.ratelimit import acquire_upstream, try_acquire_upstream, wait_for_upstream
+
+logger = logging.getLogger(__name__)
+
+# Upstream endpoints (overridable so the app can run against local stubs)
+OPENWEATHER_URL = os.environ.get("OPENWEATHER_URL", "https://api.openweathermap.org/data/2.5/weather")
+NASA_POWER_URL = os.environ.get("NASA_POWER_URL", "https://power.larc.nasa.gov/api/temporal/daily/point")
+NASA_POWER_TIMEOUT = 10
+
+
+def _openweather_url(lat, lon, api_key):
+    return f"{OPENWEATHER_URL}?lat={lat}&lon={lon}&appid={api_key}&units=metric"
+
+
+def _parse_openweather(res):
+    """Extracts (temp, humidity) from an OpenWeather JSON response."""
+    if res.get('cod') != 200:
+        record_upstream_error("openweather")
+        logger.warning("OpenWeather error: %s", res.get('message', 'Unknown error'))
+        return None, None
+
+    temp = res['main']['temp']
+    humidity = res['main']['humidity']
+    return temp, humidity
+
+
+def _nasa_power_url(lat, lon, days):
+    # Use a 5-day lag to ensure data availability (NASA POWER has a delay)
+    end_date = datetime.datetime.now().date() - datetime.timedelta(days=5)
+    start_date = end_date - datetime.timedelta(days=days)
+
+    return (
+        f"{NASA_POWER_URL}?"
+        f"parameters=PRECTOTCORR&community=AG&"
+        f"start={start_date.strftime('%Y%m%d')}&end={end_date.strftime('%Y%m%d')}&"
+        f"latitude={lat}&longitude={lon}&format=JSON"
+    )
+
+
+def _parse_nasa_rainfall(res):
+    """Averages the valid PRECTOTCORR values of a NASA POWER JSON response."""
+    # Navigate to the rainfall data
+    values = res['properties']['parameter']['PRECTOTCORR']
+    if not values:
+        return 0.0
+
+    # Filter out invalid/missing values (NASA uses -999 for missing data)
+    valid_values = [v for v in values.values() if v >= 0]
+
+    if not valid_values:
+        return 0.0
+
+    # Calculate average rainfall
+    avg_rainfall = sum(valid_values) / len(valid_values)
+    return round(avg_rainfall, 2)
+
 
 # -------------------------------
 # 🌡️ 1. OPENWEATHER API (Temp + Humidity)
 # -------------------------------
+@timed("openweather")
 def get_weather(lat, lon, api_key):
     """
     Fetches real-time temperature and humidity from OpenWeather API.
     """
     try:
-        url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-        res = requests.get(url).json()
-
-        if res.get('cod') != 200:
-            print(f"OpenWeather Error: {res.get('message', 'Unknown error')}")
-            return None, None
-
-        temp = res['main']['temp']
-        humidity = res['main']['humidity']
-        return temp, humidity
+        res = requests.get(_openweather_url(lat, lon, api_key)).json()
+        return _parse_openweather(res)
 
     except Exception as e:
-        print(f"Error fetching weather data: {e}")
+        record_upstream_error("openweather")
+        logger.warning("Error fetching weather data: %s", e)
         return None, None
 
 
 # -------------------------------
 # 🌧️ 2. NASA POWER API (Rainfall)
 # -------------------------------
+@timed("nasa_power")
 def get_nasa_rainfall(lat, lon, days=30):
     """
     Fetches average daily rainfall (in mm/day) for the past 'days' (default 30)
     using NASA POWER API (no API key required).
     """
     try:
-        # Use a 5-day lag to ensure data availability (NASA POWER has a delay)
-        end_date = datetime.datetime.now().date() - datetime.timedelta(days=5)
-        start_date = end_date - datetime.timedelta(days=days)
-
-        url = (
-            f"https://power.larc.nasa.gov/api/temporal/daily/point?"
-            f"parameters=PRECTOTCORR&community=AG&"
-            f"start={start_date.strftime('%Y%m%d')}&end={end_date.strftime('%Y%m%d')}&"
-            f"latitude={lat}&longitude={lon}&format=JSON"
-        )
-
-        res = requests.get(url, timeout=10).json()
-
-        # Navigate to the rainfall data
-        values = res['properties']['parameter']['PRECTOTCORR']
-        if not values:
-            return 0.0
-
-        # Filter out invalid/missing values (NASA uses -999 for missing data)
-        valid_values = [v for v in values.values() if v >= 0]
-        
-        if not valid_values:
-            return 0.0
-        
-        # Calculate average rainfall
-        avg_rainfall = sum(valid_values) / len(valid_values)
-        return round(avg_rainfall, 2)
+        res = requests.get(_nasa_power_url(lat, lon, days), timeout=NASA_POWER_TIMEOUT).json()
+        return _parse_nasa_rainfall(res)
 
     except Exception as e:
-        print(f"Error fetching NASA rainfall: {e}")
+        record_upstream_error("nasa_power")
+        logger.warning("Error fetching NASA rainfall: %s", e)
         return 0.0
 
 
@@ -79,4 +118,267 @@ def get_weather_and_rainfall(lat, lon, api_key, days=30):
     temp, humidity = get_weather(lat, lon, api_key)
     rainfall = get_nasa_rainfall(lat, lon, days)
 
-    return temp, humidity, rainfall
\ No newline at end of file
+    return temp, humidity, rainfall
+
+
+# -------------------------------
+# ⚡ 4. ASYNC VARIANTS (aiohttp)
+# -------------------------------
+async def _fetch_json(session, url):
+    async with session.get(url) as response:
+        return await response.json(content_type=None)
+
+
+async def get_weather_async(session, lat, lon, api_key):
+    """
+    Async version of get_weather() using a shared aiohttp ClientSession.
+    """
+    try:
+        with timed("openweather"):
+            res = await _fetch_json(session, _openweather_url(lat, lon, api_key))
+        return _parse_openweather(res)
+
+    except Exception as e:
+        record_upstream_error("openweather")
+        logger.warning("Error fetching weather data: %s", e)
+        return None, None
+
+
+async def get_nasa_rainfall_async(session, lat, lon, days=30):
+    """
+    Async version of get_nasa_rainfall() using a shared aiohttp ClientSession.
+    """
+    try:
+        with timed("nasa_power"):
+            res = await asyncio.wait_for(
+                _fetch_json(session, _nasa_power_url(lat, lon, days)), NASA_POWER_TIMEOUT
+            )
+        return _parse_nasa_rainfall(res)
+
+    except Exception as e:
+        record_upstream_error("nasa_power")
+        logger.warning("Error fetching NASA rainfall: %s", e)
+        return 0.0
+
+
+async def get_weather_and_rainfall_async(session, lat, lon, api_key, days=30):
+    """
+    Async version of get_weather_and_rainfall().
+    OpenWeather and NASA POWER are queried concurrently.
+    Returns: temp, humidity, rainfall
+    """
+    (temp, humidity), rainfall = await asyncio.gather(
+        get_weather_async(session, lat, lon, api_key),
+        get_nasa_rainfall_async(session, lat, lon, days),
+    )
+
+    return temp, humidity, rainfall
+
+
+# -------------------------------
+# 🚦 5. BUDGETED + CACHED WEATHER
+# -------------------------------
+# Live results are cached per ~11km grid cell. When the upstream budget is
+# exhausted (or the APIs fail) we degrade to a stale cached value for the
+# cell, then to training-data climatology, instead of failing the request.
+WEATHER_CELL_DEGREES = float(os.environ.get("WEATHER_CELL_DEGREES", "0.1"))
+WEATHER_CACHE_TTL = int(os.environ.get("WEATHER_CACHE_TTL", "600"))
+WEATHER_CACHE_STALE_TTL = int(os.environ.get("WEATHER_CACHE_STALE_TTL", "21600"))
+WEATHER_CACHE_MAX_CELLS = 10000
+
+LIVE_SOURCE = "Live APIs (OpenWeather + NASA)"
+CACHED_SOURCE = "Cached Live APIs (OpenWeather + NASA)"
+CLIMATOLOGY_SOURCE = "Climatology (training data median)"
+
+CROP_DATA_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'Crop_recommendation.csv')
+)
+
+_weather_cache = OrderedDict()
+_weather_cache_lock = threading.Lock()
+_climatology = None
+
+
+def weather_cell(lat, lon):
+    """Snaps coordinates to the weather grid cell used for caching and grouping."""
+    return (
+        round(round(float(lat) / WEATHER_CELL_DEGREES) * WEATHER_CELL_DEGREES, 6),
+        round(round(float(lon) / WEATHER_CELL_DEGREES) * WEATHER_CELL_DEGREES, 6),
+    )
+
+
+def _cache_get(cell, max_age):
+    with _weather_cache_lock:
+        entry = _weather_cache.get(cell)
+    if entry is None or time.monotonic() - entry[0] > max_age:
+        return None
+    return entry[1]
+
+
+def _cache_put(cell, weather):
+    with _weather_cache_lock:
+        _weather_cache[cell] = (time.monotonic(), weather)
+        _weather_cache.move_to_end(cell)
+        if len(_weather_cache) > WEATHER_CACHE_MAX_CELLS:
+            _weather_cache.popitem(last=False)
+
+
+def climatology():
+    """Median temperature, humidity and rainfall of the training data (loaded once)."""
+    global _climatology
+    if _climatology is None:
+        with open(CROP_DATA_PATH, newline='') as f:
+            rows = list(csv.DictReader(f))
+        _climatology = tuple(
+            statistics.median(float(row[column]) for row in rows)
+            for column in ('temperature', 'humidity', 'rainfall')
+        )
+    return _climatology
+
+
+def _degraded_weather(cell):
+    stale = _cache_get(cell, WEATHER_CACHE_STALE_TTL)
+    if stale is not None:
+        return (*stale, CACHED_SOURCE)
+    return (*climatology(), CLIMATOLOGY_SOURCE)
+
+
+def _admit_weather(cell, reserved=False):
+    """
+    Returns (temp, humidity, rainfall, source) when the request can be
+    answered without calling the APIs, or None when a live fetch is allowed.
+    `reserved`: the caller already took the budget (reserve_weather_budget()).
+    """
+    cached = _cache_get(cell, WEATHER_CACHE_TTL)
+    record_cache_lookup("weather", cached is not None)
+    if cached is not None:
+        return (*cached, CACHED_SOURCE)
+
+    if not reserved and not acquire_upstream("openweather", "nasa_power"):
+        record_budget_exhausted("weather")
+        return _degraded_weather(cell)
+
+    return None
+
+
+def _finish_weather(cell, temp, humidity, rainfall):
+    if temp is None or humidity is None:
+        stale = _cache_get(cell, WEATHER_CACHE_STALE_TTL)
+        if stale is not None:
+            return (*stale, CACHED_SOURCE)
+        return None, None, None, None
+
+    _cache_put(cell, (temp, humidity, rainfall))
+    return temp, humidity, rainfall, LIVE_SOURCE
+
+
+def reserve_weather_budget(cells, reserve=0.0):
+    """
+    Takes, all at once, the upstream budget needed to fetch `cells`: one
+    token per cell without a fresh cache entry, leaving `reserve` of each
+    bucket. Returns (acquired, retry_after_seconds, uncached_cells); the
+    retry is infinite when that many cells can never fit in the budget.
+    """
+    uncached = sum(_cache_get(cell, WEATHER_CACHE_TTL) is None for cell in dict.fromkeys(cells))
+    if uncached == 0:
+        return True, 0.0, 0
+    acquired, retry_after = try_acquire_upstream(("openweather", "nasa_power"), uncached, reserve)
+    return acquired, retry_after, uncached
+
+
+def get_weather_with_fallback(lat, lon, api_key, days=30):
+    """
+    Budget-aware get_weather_and_rainfall() with per-cell caching.
+    Returns: temp, humidity, rainfall, source (all None if nothing is available)
+    """
+    cell = weather_cell(lat, lon)
+    admitted = _admit_weather(cell)
+    if admitted is not None:
+        return admitted
+
+    temp, humidity, rainfall = get_weather_and_rainfall(lat, lon, api_key, days)
+    return _finish_weather(cell, temp, humidity, rainfall)
+
+
+async def get_weather_with_fallback_async(session, lat, lon, api_key, days=30, reserved=False):
+    """
+    Async version of get_weather_with_fallback().
+    """
+    cell = weather_cell(lat, lon)
+    admitted = _admit_weather(cell, reserved)
+    if admitted is not None:
+        return admitted
+
+    temp, humidity, rainfall = await get_weather_and_rainfall_async(session, lat, lon, api_key, days)
+    return _finish_weather(cell, temp, humidity, rainfall)
+
+
+def get_weather_waiting(lat, lon, api_key, max_wait, days=30):
+    """
+    get_weather_with_fallback() for bulk jobs: when the budget is exhausted it
+    waits up to `max_wait` seconds for a token (leaving the live-request
+    reserve untouched) instead of degrading, and only then falls back.
+    """
+    cell = weather_cell(lat, lon)
+    cached = _cache_get(cell, WEATHER_CACHE_TTL)
+    record_cache_lookup("weather", cached is not None)
+    if cached is not None:
+        return (*cached, CACHED_SOURCE)
+
+    if not wait_for_upstream(("openweather", "nasa_power"), max_wait):
+        record_budget_exhausted("weather_bulk")
+        return _degraded_weather(cell)
+
+    temp, humidity, rainfall = get_weather_and_rainfall(lat, lon, api_key, days)
+    return _finish_weather(cell, temp, humidity, rainfall)
+
+
+def fetch_weather_cells(cells, api_key, max_workers=8, days=30, max_wait=None):
+    """
+    Fetches weather once per (lat, lon) cell with a bounded thread pool.
+    With `max_wait` (seconds) cells wait for upstream budget as in
+    get_weather_waiting() rather than degrading straight away.
+    Returns {cell: (temp, humidity, rainfall, source)}.
+    """
+    cells = list(dict.fromkeys(cells))
+    if not cells:
+        return {}
+
+    def fetch(cell):
+        if max_wait is None:
+            return get_weather_with_fallback(cell[0], cell[1], api_key, days)
+        return get_weather_waiting(cell[0], cell[1], api_key, max_wait, days)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(cells))) as pool:
+        return dict(zip(cells, pool.map(fetch, cells)))
+
+
+async def fetch_weather_cells_async(session, cells, api_key, concurrency=64, days=30, reserved=False):
+    """
+    Async fetch_weather_cells(): at most `concurrency` cells in flight on the
+    given session, OpenWeather and NASA POWER queried concurrently per cell.
+    With `reserved` the budget was already taken by reserve_weather_budget().
+    Returns {cell: (temp, humidity, rainfall, source)}.
+    """
+    cells = list(dict.fromkeys(cells))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(cell):
+        async with semaphore:
+            return await get_weather_with_fallback_async(session, cell[0], cell[1], api_key, days, reserved)
+
+    results = await asyncio.gather(*(fetch(cell) for cell in cells))
+    return dict(zip(cells, results))
+
+
+def fetch_weather_cells_concurrently(cells, api_key, concurrency=64, days=30, reserved=False):
+    """
+    fetch_weather_cells_async() for synchronous callers: runs on a private
+    event loop and session, so total latency tracks the slowest cell rather
+    than the sum.
+    """
+    async def run():
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15)) as session:
+            return await fetch_weather_cells_async(session, cells, api_key, concurrency, days, reserved)
+
+    return asyncio.run(run())
@@ -0,0 +1,294 @@
+"""
+ASGI entry point for the Crop Recommendation API.
+
+The I/O-bound routes (/api/recommend/live, /api/recommend/compare and
+/api/location) are served natively with asyncio + aiohttp, so a single
+worker can hold hundreds of in-flight upstream calls. Every other route is delegated to the existing
+Flask app through asgiref's WSGI adapter, running on a pool of WSGI_WORKERS threads (asgiref's
+default would put every Flask request on one shared thread, one at a time).
+
+Run with:
+    uvicorn app.asgi:app --host 0.0.0.0 --port 5001
+"""
+import sys
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.main import app as flask_app, API_KEY
+from app.utils import (recommend_crop_live_async, recommend_crop_compare_async, get_current_location_async,
+                       parse_live_request, finish_live_result, parse_top_k)
+from app.metrics import record_request
+from app import ratelimit
+from app import logs
+
+# Bounded pool for the CPU-bound scale + predict step
+PREDICT_WORKERS = int(os.environ.get("PREDICT_WORKERS", "4"))
+# Connection pool size for the shared upstream HTTP session
+UPSTREAM_CONNECTIONS = int(os.environ.get("UPSTREAM_CONNECTIONS", "512"))
+# Threads serving the delegated Flask routes concurrently
+WSGI_WORKERS = int(os.environ.get("WSGI_WORKERS", "16"))
+
+predict_executor = ThreadPoolExecutor(max_workers=PREDICT_WORKERS, thread_name_prefix="predict")
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_WORKERS, thread_name_prefix="wsgi")
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    def __init__(self, wsgi_application, executor, duplicate_header_limit=100):
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        # The base method is wrapped in a thread-sensitive sync_to_async,
+        # which serialises every request on one thread; run it on our pool
+        run = WsgiToAsgiInstance.run_wsgi_app.__wrapped__
+        await sync_to_async(run, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi that serves requests concurrently on `executor`."""
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        await _PooledWsgiInstance(self.wsgi_application, self.executor, self.duplicate_header_limit)(
+            scope, receive, send
+        )
+
+
+wsgi_app = PooledWsgiToAsgi(flask_app, wsgi_executor)
+
+_session = None
+
+
+async def _get_session():
+    """Returns the shared aiohttp session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=UPSTREAM_CONNECTIONS),
+            timeout=aiohttp.ClientTimeout(total=15),
+        )
+    return _session
+
+
+async def _read_json(receive):
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return json.loads(body or b"{}")
+
+
+async def _send_json(send, payload, status=200):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_too_many_requests(send, error, retry_after):
+    body = json.dumps({"success": False, "error": error}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", ratelimit.retry_after_header(retry_after).encode()),
+            (b"access-control-allow-origin", b"*"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _scope_client_id(scope):
+    headers = {name.decode("latin-1").title(): value.decode("latin-1") for name, value in scope["headers"]}
+    client = scope.get("client")
+    return ratelimit.client_id(headers, client[0] if client else None)
+
+
+async def _send_preflight(send):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"access-control-allow-origin", b"*"),
+            (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+            (b"access-control-allow-headers", b"Content-Type"),
+            (b"content-length", b"0"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def detect_location(scope, receive, send):
+    """Detect current location"""
+    allowed, retry_after = ratelimit.CLIENT_LIMITER.try_acquire(_scope_client_id(scope))
+    if not allowed:
+        await _send_too_many_requests(send, "Rate limit exceeded", retry_after)
+        return
+
+    try:
+        session = await _get_session()
+        lat, lon, city, country = await get_current_location_async(session)
+        await _send_json(send, {
+            "success": True,
+            "location": {
+                "latitude": lat,
+                "longitude": lon,
+                "city": city,
+                "country": country
+            }
+        })
+    except Exception as e:
+        await _send_json(send, {"success": False, "error": str(e)}, 500)
+
+
+async def recommend_live(scope, receive, send):
+    """
+    Live mode: Auto-detect location and fetch weather
+    Request body: { N, P, K, ph, useCurrentLocation, latitude?, longitude?, field_id?, top_k?, explain? }
+    """
+    rejection = ratelimit.admit_live(_scope_client_id(scope), ratelimit.ASYNC_LIVE_INFLIGHT)
+    if rejection is not None:
+        await _send_too_many_requests(send, *rejection)
+        return
+
+    start = time.perf_counter()
+    try:
+        try:
+            live = parse_live_request(await _read_json(receive))
+        except ValueError as e:
+            await _send_json(send, {"success": False, "error": str(e)}, 400)
+            return
+
+        session = await _get_session()
+        location = live.pop("location") or await get_current_location_async(session)
+        result = await recommend_crop_live_async(
+            lat=location[0], lon=location[1], api_key=API_KEY, session=session,
+            executor=predict_executor, **live
+        )
+
+        if "error" in result:
+            await _send_json(send, {"success": False, "error": result["error"]}, 400)
+            return
+
+        await _send_json(send, finish_live_result(result, location, time.perf_counter() - start))
+
+    except Exception as e:
+        await _send_json(send, {"success": False, "error": str(e)}, 500)
+    finally:
+        ratelimit.ASYNC_LIVE_INFLIGHT.leave()
+
+
+async def recommend_compare(scope, receive, send):
+    """
+    Compare mode: one soil profile (or one per location) across many coordinates
+    Request body: { locations: [{ latitude, longitude, N?, P?, K?, ph? }, ...],
+                    soil?: { N, P, K, ph }, top_k? }
+    """
+    allowed, retry_after = ratelimit.CLIENT_LIMITER.try_acquire(_scope_client_id(scope))
+    if not allowed:
+        await _send_too_many_requests(send, "Rate limit exceeded", retry_after)
+        return
+
+    try:
+        data = await _read_json(receive)
+        session = await _get_session()
+
+        try:
+            top_k = parse_top_k(data.get('top_k'))
+        except ValueError as e:
+            await _send_json(send, {"success": False, "error": str(e)}, 400)
+            return
+        result = await recommend_crop_compare_async(
+            data.get('locations'), API_KEY, session, predict_executor, data.get('soil'), top_k
+        )
+
+        if "retry_after" in result:
+            await _send_too_many_requests(send, result["error"], result["retry_after"])
+            return
+        if "error" in result:
+            await _send_json(send, {"success": False, "error": result["error"]}, 400)
+            return
+
+        result["success"] = True
+        await _send_json(send, result)
+
+    except Exception as e:
+        await _send_json(send, {"success": False, "error": str(e)}, 500)
+
+
+ASYNC_ROUTES = {
+    ("GET", "/api/location"): detect_location,
+    ("POST", "/api/recommend/live"): recommend_live,
+    ("POST", "/api/recommend/compare"): recommend_compare,
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await _get_session()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _session is not None:
+                await _session.close()
+            predict_executor.shutdown(wait=False)
+            wsgi_executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    if scope["type"] == "http":
+        path = scope["path"]
+        method = scope["method"]
+        handler = ASYNC_ROUTES.get((method, path))
+        if handler is not None:
+            start = time.perf_counter()
+            status = {}
+            headers = {name.decode("latin-1").title(): value.decode("latin-1") for name, value in scope["headers"]}
+            request_log = logs.start_request(logs.request_id_from(headers))
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+                    message = {**message, "headers": list(message.get("headers", [])) + [
+                        (logs.REQUEST_ID_HEADER.lower().encode(), request_log.id.encode())]}
+                await send(message)
+
+            await handler(scope, receive, send_with_status)
+            record_request(path, method, status.get("code", 500), time.perf_counter() - start)
+            logs.finish_request(request_log, method, path, status.get("code", 500))
+            return
+        if method == "OPTIONS" and any(route_path == path for _, route_path in ASYNC_ROUTES):
+            await _send_preflight(send)
+            return
+
+    await wsgi_app(scope, receive, send)
@@ -0,0 +1,157 @@
+"""
+Per-prediction feature attributions for the random forest (Saabas /
+tree-path method).
+
+For every tree, each node's class distribution minus its parent's is
+credited to the feature the parent splits on; summing along the decision
+path gives   leaf value = root value + Σ feature contributions.
+Those cumulative contributions are precomputed once per leaf, so
+explaining a row only needs the leaf each tree lands in. The leaves are
+found by walking all trees at once as flat NumPy arrays (one vectorized
+step per depth level), so the cost is a few array ops per level rather
+than one Python call per tree. Large batches use the forest's own
+compiled apply() instead, which wins once its per-call overhead is
+amortized.
+
+Explainers are cached per model version.
+"""
+import threading
+
+import numpy as np
+
+# Rows per chunk when explaining large batches (bounds temporary memory)
+EXPLAIN_CHUNK_ROWS = 1024
+# From this many rows model.apply() beats the NumPy walk
+APPLY_MIN_ROWS = 256
+
+_explainers = {}
+_explainers_lock = threading.Lock()
+
+
+class ForestExplainer:
+    def __init__(self, model):
+        self.model = model
+        self.n_features = model.n_features_in_
+        self.n_classes = len(model.classes_)
+        self.n_trees = len(model.estimators_)
+
+        features, thresholds, lefts, rights, leaf_slots = [], [], [], [], []
+        leaf_values, leaf_contributions, roots = [], [], []
+        root_values = np.zeros(self.n_classes)
+        offset = leaf_offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            value = tree.value[:, 0, :]
+            value = value / value.sum(axis=1, keepdims=True)
+            left, right = tree.children_left, tree.children_right
+
+            # Cumulative (feature, class) contribution from the root to every node.
+            # sklearn numbers children after their parent, so one forward pass suffices.
+            cumulative = np.zeros((tree.node_count, self.n_classes, self.n_features))
+            for node in range(tree.node_count):
+                if left[node] == -1:
+                    continue
+                feature = tree.feature[node]
+                for child in (left[node], right[node]):
+                    cumulative[child] = cumulative[node]
+                    cumulative[child, :, feature] += value[child] - value[node]
+
+            is_leaf = left == -1
+            slots = np.full(tree.node_count, -1)
+            slots[is_leaf] = leaf_offset + np.arange(is_leaf.sum())
+
+            roots.append(offset)
+            root_values += value[0]
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, -1, left + offset))
+            rights.append(np.where(is_leaf, -1, right + offset))
+            leaf_slots.append(slots)
+            leaf_values.append(value[is_leaf])
+            leaf_contributions.append(cumulative[is_leaf].astype(np.float32))
+            offset += tree.node_count
+            leaf_offset += int(is_leaf.sum())
+
+        # Tree i's node ids start at roots[i] in the flat arrays
+        self.roots = np.array(roots)
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts)
+        self.right = np.concatenate(rights)
+        self.leaf_slot = np.concatenate(leaf_slots)
+        self.leaf_value = np.concatenate(leaf_values)
+        # (n_leaves, n_classes, n_features)
+        self.leaf_contribution = np.concatenate(leaf_contributions)
+        self.bias = root_values / self.n_trees
+
+    def leaves(self, scaled_features):
+        """Leaf slot reached in every tree: (n_rows, n_trees)."""
+        if len(scaled_features) >= APPLY_MIN_ROWS:
+            return self.leaf_slot[self.model.apply(scaled_features) + self.roots]
+
+        # Trees compare float32 inputs, exactly like sklearn's tree.apply
+        X = np.asarray(scaled_features, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        while True:
+            left = self.left[node]
+            internal = left != -1
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(internal, np.where(go_left, left, self.right[node]), node)
+        return self.leaf_slot[node]
+
+    def explain(self, scaled_features, class_indices=None):
+        """
+        Attributions for each row of an already-scaled (n, n_features) array.
+
+        class_indices: class to explain per row (defaults to the most probable).
+        Returns (class_indices, probabilities, bias, contributions) where
+        contributions is (n, n_features) and bias + Σ contributions equals
+        the explained class's forest probability.
+        """
+        leaves = self.leaves(scaled_features)
+        probabilities = self.leaf_value[leaves].mean(axis=1)
+        if class_indices is None:
+            class_indices = probabilities.argmax(axis=1)
+        class_indices = np.asarray(class_indices)
+
+        contributions = self.leaf_contribution[leaves, class_indices[:, None]].mean(axis=1)
+        rows = np.arange(len(class_indices))
+        return class_indices, probabilities[rows, class_indices], self.bias[class_indices], contributions
+
+
+def get_explainer(model, model_version):
+    """ForestExplainer for the model, built once per model version."""
+    explainer = _explainers.get(model_version)
+    if explainer is None:
+        with _explainers_lock:
+            explainer = _explainers.get(model_version)
+            if explainer is None:
+                explainer = _explainers[model_version] = ForestExplainer(model)
+    return explainer
+
+
+def explain_scaled(model, model_version, scaled_features, feature_names, class_indices=None):
+    """
+    JSON-ready explanations for each row of an already-scaled array:
+    [{crop, probability, bias, contributions: {feature: value}}, ...]
+    """
+    explainer = get_explainer(model, model_version)
+    classes = [str(c) for c in model.classes_]
+    explanations = []
+    for start in range(0, len(scaled_features), EXPLAIN_CHUNK_ROWS):
+        chunk = slice(start, start + EXPLAIN_CHUNK_ROWS)
+        indices, probability, bias, contributions = explainer.explain(
+            scaled_features[chunk], None if class_indices is None else class_indices[chunk]
+        )
+        for i, p, b, row in zip(indices.tolist(), probability.tolist(), bias.tolist(),
+                                np.round(contributions.astype(float), 4).tolist()):
+            explanations.append({
+                "crop": classes[i],
+                "probability": round(p, 4),
+                "bias": round(b, 4),
+                "contributions": dict(zip(feature_names, row)),
+            })
+    return explanations
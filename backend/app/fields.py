@@ -0,0 +1,362 @@
+"""
+Persistent field registry with scheduled bulk re-recommendation.
+
+Fields (coordinates + latest soil values) live in SQLite. A run groups all
+fields by weather grid cell, fetches weather once per cell on a bounded
+pool, scores every field with vectorized predict calls and stores the
+latest recommendation per field for fast retrieval.
+
+Every server process may run the scheduler, so a run is claimed by
+inserting its 'running' row in SQLite only when no other live run (and,
+for scheduled runs, no run within the interval) exists. The owner keeps
+a heartbeat on the row; a run whose heartbeat stops (crashed process) is
+marked abandoned so the next claim can proceed.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from api.weather_api import weather_cell, fetch_weather_cells, CLIMATOLOGY_SOURCE
+from app.utils import predict_crops
+from app.metrics import FIELD_RUN_DURATION, FIELD_RUN_FIELDS, FIELD_RUN_PROGRESS
+from app import iot
+from app import validation
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FIELDS_DB = os.environ.get("FIELDS_DB", os.path.join(BASE_DIR, "data", "fields.sqlite3"))
+FIELD_WEATHER_WORKERS = int(os.environ.get("FIELD_WEATHER_WORKERS", "8"))
+FIELD_PREDICT_BATCH = int(os.environ.get("FIELD_PREDICT_BATCH", "5000"))
+# How long one cell may wait for upstream budget before falling back to climatology
+FIELD_BUDGET_WAIT_SECONDS = float(os.environ.get("FIELD_BUDGET_WAIT_SECONDS", "300"))
+FIELD_RUN_HEARTBEAT_SECONDS = float(os.environ.get("FIELD_RUN_HEARTBEAT_SECONDS", "30"))
+# A 'running' row without a heartbeat for this long belongs to a dead process
+FIELD_RUN_STALE_SECONDS = float(os.environ.get("FIELD_RUN_STALE_SECONDS", "300"))
+SOIL_COLUMNS = ('N', 'P', 'K', 'ph')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fields (
+    field_id TEXT PRIMARY KEY,
+    name TEXT,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    N REAL, P REAL, K REAL, ph REAL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS field_recommendations (
+    field_id TEXT PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    recommended_crop TEXT NOT NULL,
+    temperature REAL, humidity REAL, rainfall REAL,
+    weather_data_source TEXT,
+    soil_data_source TEXT,
+    computed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS field_runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    status TEXT NOT NULL,
+    heartbeat_at REAL,
+    total_fields INTEGER DEFAULT 0,
+    scored_fields INTEGER DEFAULT 0,
+    failed_fields INTEGER DEFAULT 0,
+    climatology_fields INTEGER DEFAULT 0,
+    weather_cells INTEGER DEFAULT 0,
+    duration_seconds REAL,
+    error TEXT
+);
+"""
+# Columns added after a table was first released: (table, column, definition)
+_ADDED_COLUMNS = (
+    ("field_runs", "climatology_fields", "INTEGER DEFAULT 0"),
+    ("field_runs", "heartbeat_at", "REAL"),
+)
+
+_progress = {}
+logger = logging.getLogger(__name__)
+_scheduler = None
+
+
+def _connect():
+    conn = sqlite3.connect(FIELDS_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_db():
+    os.makedirs(os.path.dirname(FIELDS_DB), exist_ok=True)
+    with _connect() as conn:
+        conn.executescript(_SCHEMA)
+        for table, column, definition in _ADDED_COLUMNS:
+            columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+# ------------------------------
+# 🗂️ Registry
+# ------------------------------
+def upsert_fields(fields):
+    """
+    Registers or updates fields in bulk.
+    Each item: { field_id, latitude, longitude, name?, N?, P?, K?, ph? }
+    Returns the number of fields written; raises ValueError on bad input.
+    """
+    now = time.time()
+    rows = []
+    for field in fields:
+        try:
+            soil = [None if field.get(c) is None else float(field[c]) for c in SOIL_COLUMNS]
+            rows.append((str(field['field_id']), field.get('name'),
+                         float(field['latitude']), float(field['longitude']), *soil, now))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid field {field!r}: {e}")
+
+    with _connect() as conn:
+        conn.executemany(
+            """
+            INSERT INTO fields (field_id, name, latitude, longitude, N, P, K, ph, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(field_id) DO UPDATE SET
+                name = COALESCE(excluded.name, fields.name),
+                latitude = excluded.latitude,
+                longitude = excluded.longitude,
+                N = COALESCE(excluded.N, fields.N),
+                P = COALESCE(excluded.P, fields.P),
+                K = COALESCE(excluded.K, fields.K),
+                ph = COALESCE(excluded.ph, fields.ph),
+                updated_at = excluded.updated_at
+            """,
+            rows,
+        )
+    return len(rows)
+
+
+def get_field(field_id):
+    """Field record with its latest stored recommendation, or None."""
+    with _connect() as conn:
+        field = conn.execute("SELECT * FROM fields WHERE field_id = ?", (field_id,)).fetchone()
+        if field is None:
+            return None
+        recommendation = conn.execute(
+            "SELECT * FROM field_recommendations WHERE field_id = ?", (field_id,)
+        ).fetchone()
+
+    result = dict(field)
+    result["recommendation"] = dict(recommendation) if recommendation else None
+    return result
+
+
+def list_runs(limit=20):
+    with _connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM field_runs ORDER BY run_id DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def current_progress():
+    """Progress of the run in flight (empty dict when idle)."""
+    return dict(_progress)
+
+
+# ------------------------------
+# 🔁 Bulk re-recommendation
+# ------------------------------
+def _load_fields(conn):
+    rows = conn.execute(
+        "SELECT field_id, latitude, longitude, N, P, K, ph FROM fields ORDER BY field_id"
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _soil_for(field):
+    """Latest IoT aggregate when sensors report for the field, else the registry values."""
+    soil = iot.latest_soil(field['field_id']) or {}
+    values = [soil.get(c, field[c]) for c in SOIL_COLUMNS]
+    source = "IoT Sensors" if soil else "Registry"
+    return values, source
+
+
+def _claim_run(min_interval=0):
+    """
+    Inserts a 'running' row unless a run is already in progress in any
+    process, or one started less than `min_interval` seconds ago. The check
+    and the insert are one statement, so concurrent claims cannot both win.
+    Returns (run_id, started_at), or None when the claim was refused.
+    """
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            """
+            UPDATE field_runs SET status = 'abandoned', finished_at = ?, error = 'heartbeat lost'
+            WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < ?
+            """,
+            (now, now - FIELD_RUN_STALE_SECONDS),
+        )
+        cursor = conn.execute(
+            """
+            INSERT INTO field_runs (started_at, heartbeat_at, status)
+            SELECT ?, ?, 'running'
+            WHERE NOT EXISTS (
+                SELECT 1 FROM field_runs WHERE status = 'running' OR started_at > ?
+            )
+            """,
+            (now, now, now - min_interval),
+        )
+    if cursor.rowcount != 1:
+        return None
+    return cursor.lastrowid, now
+
+
+def _heartbeat(run_id, stop):
+    while not stop.wait(FIELD_RUN_HEARTBEAT_SECONDS):
+        try:
+            with _connect() as conn:
+                conn.execute("UPDATE field_runs SET heartbeat_at = ? WHERE run_id = ?", (time.time(), run_id))
+        except sqlite3.Error as e:
+            logger.warning("Field run %s heartbeat failed: %s", run_id, e)
+
+
+def run_rerecommendation(api_key, min_interval=0, claim=None):
+    """
+    Re-scores every registered field. Returns the run summary, or None if
+    another run is in progress (in this or another process) or, with
+    `min_interval`, one started less than that many seconds ago. `claim` is
+    a (run_id, started_at) pair already taken with _claim_run().
+    """
+    claim = claim or _claim_run(min_interval)
+    if claim is None:
+        return None
+    run_id, started_at = claim
+
+    started = time.perf_counter()
+    stop_heartbeat = threading.Event()
+    threading.Thread(target=_heartbeat, args=(run_id, stop_heartbeat),
+                     name="field-run-heartbeat", daemon=True).start()
+    try:
+        with _connect() as conn:
+            fields = _load_fields(conn)
+
+        _progress.clear()
+        _progress.update({"run_id": run_id, "stage": "weather", "total_fields": len(fields),
+                          "scored_fields": 0, "started_at": started_at})
+        FIELD_RUN_PROGRESS.set(0.0)
+
+        # 1️⃣ One weather fetch per grid cell, bounded concurrency; cells wait
+        #    for upstream budget (leaving live requests their reserve) instead
+        #    of degrading to climatology
+        cells = [weather_cell(f['latitude'], f['longitude']) for f in fields]
+        weather = fetch_weather_cells(cells, api_key, FIELD_WEATHER_WORKERS,
+                                      max_wait=FIELD_BUDGET_WAIT_SECONDS)
+        _progress.update({"stage": "scoring", "weather_cells": len(weather)})
+
+        # 2️⃣ Assemble feature rows; fields without soil or weather are failures
+        rows, scored, failed = [], [], 0
+        for field, cell in zip(fields, cells):
+            soil, soil_source = _soil_for(field)
+            temp, humidity, rainfall, weather_source = weather[cell]
+            if temp is None or any(v is None for v in soil):
+                failed += 1
+                continue
+            N, P, K, ph = soil
+            rows.append([N, P, K, temp, humidity, ph, rainfall])
+            scored.append((field['field_id'], temp, humidity, rainfall, weather_source, soil_source))
+
+        # 3️⃣ Vectorized predict per batch, results stored per batch
+        computed_at = time.time()
+        features = np.asarray(rows, dtype=float).reshape(-1, 7)
+        # Rows the validator rejects (impossible values) count as failures
+        rejected, _ = validation.check(features)
+        if rejected.any():
+            failed += int(rejected.sum())
+            features = features[~rejected]
+            scored = [entry for entry, dropped in zip(scored, rejected) if not dropped]
+        for start in range(0, len(scored), FIELD_PREDICT_BATCH):
+            batch = scored[start:start + FIELD_PREDICT_BATCH]
+            crops = predict_crops(features[start:start + FIELD_PREDICT_BATCH])
+            with _connect() as conn:
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO field_recommendations
+                    (field_id, run_id, recommended_crop, temperature, humidity, rainfall,
+                     weather_data_source, soil_data_source, computed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    [(field_id, run_id, str(crop), temp, humidity, rainfall, w_source, s_source, computed_at)
+                     for (field_id, temp, humidity, rainfall, w_source, s_source), crop in zip(batch, crops)],
+                )
+            _progress["scored_fields"] = start + len(batch)
+            FIELD_RUN_PROGRESS.set(_progress["scored_fields"] / max(len(fields), 1))
+
+        # Fields scored on climatology are reported apart from real successes
+        climatology = sum(entry[4] == CLIMATOLOGY_SOURCE for entry in scored)
+        duration = time.perf_counter() - started
+        summary = {"run_id": run_id, "status": "degraded" if climatology else "completed",
+                   "total_fields": len(fields), "scored_fields": len(scored) - climatology,
+                   "climatology_fields": climatology, "failed_fields": failed,
+                   "weather_cells": len(weather), "duration_seconds": round(duration, 3)}
+        error = None
+    except Exception as e:
+        duration = time.perf_counter() - started
+        summary = {"run_id": run_id, "status": "failed", "duration_seconds": round(duration, 3)}
+        error = str(e)
+    finally:
+        _progress.clear()
+        stop_heartbeat.set()
+
+    FIELD_RUN_DURATION.observe(duration)
+    FIELD_RUN_FIELDS.inc("scored", amount=summary.get("scored_fields", 0))
+    FIELD_RUN_FIELDS.inc("climatology", amount=summary.get("climatology_fields", 0))
+    FIELD_RUN_FIELDS.inc("failed", amount=summary.get("failed_fields", 0))
+    with _connect() as conn:
+        conn.execute(
+            """
+            UPDATE field_runs SET finished_at = ?, status = ?, total_fields = ?, scored_fields = ?,
+                failed_fields = ?, climatology_fields = ?, weather_cells = ?, duration_seconds = ?,
+                error = ?
+            WHERE run_id = ?
+            """,
+            (time.time(), summary["status"], summary.get("total_fields", 0),
+             summary.get("scored_fields", 0), summary.get("failed_fields", 0),
+             summary.get("climatology_fields", 0),
+             summary.get("weather_cells", 0), duration, error, run_id),
+        )
+    return summary
+
+
+def start_run_in_background(api_key):
+    """Starts a run on a daemon thread. Returns False if one is already running."""
+    claim = _claim_run()
+    if claim is None:
+        return False
+    threading.Thread(target=run_rerecommendation, args=(api_key,), kwargs={"claim": claim},
+                     name="field-rerun", daemon=True).start()
+    return True
+
+
+def start_scheduler(api_key, interval_seconds):
+    """
+    Runs run_rerecommendation() every `interval_seconds` on a daemon thread.
+    Every process may start one; the claim in SQLite lets only the first
+    process whose timer fires in an interval run it.
+    """
+    global _scheduler
+    if _scheduler is not None or interval_seconds <= 0:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                # A little under the interval, so timer jitter never skips a run
+                run_rerecommendation(api_key, min_interval=interval_seconds * 0.9)
+            except Exception:
+                logger.exception("Field re-recommendation run failed")
+
+    _scheduler = threading.Thread(target=loop, name="field-scheduler", daemon=True)
+    _scheduler.start()
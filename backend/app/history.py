@@ -0,0 +1,411 @@
+"""
+Columnar history of served recommendations.
+
+Every recommendation (inputs, weather/soil source, prediction, latency,
+model version) is handed to a bounded queue and returned immediately; a
+background writer drains it and flushes compressed column segments into
+day partitions:
+
+    HISTORY_DIR/date=YYYY-MM-DD/part-<ms>-<pid>-<seq>.npz
+
+Each segment stores one array per column (strings dictionary-encoded as
+int codes + a vocabulary), so a query only decompresses the columns it
+asks for, from the partitions inside its date range.
+
+Once a UTC day has closed, its segments are merged into a single
+compact-<ms>-<pid>.npz that lists the segments it replaces (__sources),
+so scans of past days open one file instead of thousands. Readers skip
+listed segments that are still on disk, so a scan racing a compaction
+never counts a row twice.
+"""
+import atexit
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.utils import FEATURE_COLUMNS, MODEL_VERSION
+from app.metrics import HISTORY_ROWS
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HISTORY_DIR = os.environ.get("HISTORY_DIR", os.path.join(BASE_DIR, "data", "history"))
+HISTORY_ENABLED = os.environ.get("HISTORY_ENABLED", "1") == "1"
+HISTORY_FLUSH_ROWS = int(os.environ.get("HISTORY_FLUSH_ROWS", "20000"))
+HISTORY_FLUSH_SECONDS = float(os.environ.get("HISTORY_FLUSH_SECONDS", "60"))
+HISTORY_QUEUE_MAX = int(os.environ.get("HISTORY_QUEUE_MAX", "100000"))
+HISTORY_COMPACT = os.environ.get("HISTORY_COMPACT", "1") == "1"
+# A compaction lock older than this was left by a crashed process
+COMPACT_LOCK_STALE_SECONDS = 3600
+TRAINING_DATA_PATH = os.path.join(BASE_DIR, "data", "Crop_recommendation.csv")
+
+# Column layout of every segment (row tuples follow this order)
+NUMERIC_COLUMNS = (('ts', np.float64),) + tuple((c, np.float32) for c in FEATURE_COLUMNS) + (
+    ('latitude', np.float32), ('longitude', np.float32), ('latency_ms', np.float32))
+CATEGORICAL_COLUMNS = ('mode', 'crop', 'weather_source', 'soil_source', 'model_version')
+COLUMNS = tuple(name for name, _ in NUMERIC_COLUMNS) + CATEGORICAL_COLUMNS
+
+_queue = queue.Queue(maxsize=HISTORY_QUEUE_MAX)
+_writer = None
+_writer_lock = threading.Lock()
+_sequence = 0
+_training = None
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------
+# ✍️ Buffered writer
+# ------------------------------
+def _to_row(result, latency_seconds):
+    inputs = result.get("input_data") or {}
+    location = result.get("location") or {}
+    features = [result[c] if c in ('temperature', 'humidity', 'rainfall') else inputs[c]
+                for c in FEATURE_COLUMNS]
+    return (
+        time.time(),
+        *(float(v) for v in features),
+        float(location.get("latitude", np.nan)),
+        float(location.get("longitude", np.nan)),
+        latency_seconds * 1000.0,
+        str(result.get("mode", "")),
+        str(result["recommended_crop"]),
+        str(result.get("weather_data_source", "")),
+        str(result.get("soil_data_source", "")),
+        str(MODEL_VERSION),
+    )
+
+
+def record(result, latency_seconds):
+    """
+    Queues one recommendation result dict for the history store without
+    blocking; rows are dropped (and counted) when the queue is full.
+    """
+    if not HISTORY_ENABLED:
+        return
+    try:
+        row = _to_row(result, latency_seconds)
+    except (KeyError, TypeError, ValueError):
+        HISTORY_ROWS.inc("dropped")
+        return
+
+    _ensure_writer()
+    try:
+        _queue.put_nowait(row)
+    except queue.Full:
+        HISTORY_ROWS.inc("dropped")
+
+
+def flush(timeout=10.0):
+    """Blocks until every row queued so far is on disk (or the timeout passes)."""
+    if _writer is None:
+        return True
+    done = threading.Event()
+    _queue.put(done)
+    return done.wait(timeout)
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name="history-writer", daemon=True)
+            _writer.start()
+            atexit.register(flush)
+
+
+def _writer_loop():
+    buffer = []
+    last_flush = time.monotonic()
+    compacted_before = None
+    while True:
+        timeout = max(HISTORY_FLUSH_SECONDS - (time.monotonic() - last_flush), 0.0)
+        try:
+            item = _queue.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+
+        if isinstance(item, tuple):
+            buffer.append(item)
+            if len(buffer) < HISTORY_FLUSH_ROWS:
+                continue
+        if buffer:
+            try:
+                _write_segments(buffer)
+                HISTORY_ROWS.inc("written", amount=len(buffer))
+            except Exception:
+                HISTORY_ROWS.inc("dropped", amount=len(buffer))
+                logger.exception("Failed to write recommendation history")
+            buffer = []
+        last_flush = time.monotonic()
+        if isinstance(item, threading.Event):
+            item.set()
+
+        # Merge the partitions of days that closed since the last pass
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        if HISTORY_COMPACT and today != compacted_before:
+            try:
+                compact_closed_partitions(today)
+            except Exception:
+                logger.exception("History compaction failed")
+            compacted_before = today
+
+
+def _encode(arrays, numeric, categorical):
+    """Column arrays ready for np.savez (categoricals as codes + vocabulary)."""
+    for name, values in categorical.items():
+        vocab, codes = np.unique(values, return_inverse=True)
+        arrays[name] = codes.astype(np.int32)
+        arrays[f"{name}__vocab"] = vocab
+    arrays.update(numeric)
+    return arrays
+
+
+def _save(path, arrays):
+    # Write under a temporary name so readers never see a partial segment
+    with open(path + ".tmp", 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+
+def _write_segments(rows):
+    """Writes buffered rows as one compressed segment per day partition."""
+    global _sequence
+    columns = list(zip(*rows))
+    days = np.array([datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).date().isoformat()
+                     for ts in columns[0]])
+
+    for day in np.unique(days):
+        selected = np.flatnonzero(days == day)
+        numeric = {name: np.asarray(columns[i], dtype=dtype)[selected]
+                   for i, (name, dtype) in enumerate(NUMERIC_COLUMNS)}
+        categorical = {name: np.asarray(columns[i])[selected]
+                       for i, name in enumerate(CATEGORICAL_COLUMNS, start=len(NUMERIC_COLUMNS))}
+
+        partition = os.path.join(HISTORY_DIR, f"date={day}")
+        os.makedirs(partition, exist_ok=True)
+        _sequence += 1
+        path = os.path.join(partition, f"part-{int(time.time() * 1000)}-{os.getpid()}-{_sequence}.npz")
+        _save(path, _encode({}, numeric, categorical))
+
+
+# ------------------------------
+# 🧱 Compaction
+# ------------------------------
+def _acquire_compact_lock(partition):
+    """Exclusive per-partition lock file (shared by all processes); False if held."""
+    lock = os.path.join(partition, ".compact.lock")
+    for _ in range(2):
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) < COMPACT_LOCK_STALE_SECONDS:
+                    return False
+                os.remove(lock)
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def compact_partition(partition):
+    """
+    Merges every segment of a day partition into one compacted segment.
+    Returns the number of segments merged (0 when there was nothing to do
+    or another process holds the partition).
+    """
+    if not _acquire_compact_lock(partition):
+        return 0
+    try:
+        paths, leftovers = _list_partition(partition)
+        # Segments an interrupted compaction merged but did not get to delete
+        for path in leftovers:
+            os.remove(path)
+        if len(paths) < 2:
+            return 0
+        numeric = {name: [] for name, _ in NUMERIC_COLUMNS}
+        categorical = {name: [] for name in CATEGORICAL_COLUMNS}
+        for path in paths:
+            with np.load(path) as segment:
+                for name in numeric:
+                    numeric[name].append(segment[name])
+                for name in categorical:
+                    categorical[name].append(segment[f"{name}__vocab"][segment[name]])
+
+        # Every segment it replaces, including those an older compaction replaced
+        sources = [os.path.basename(path) for path in paths]
+        arrays = _encode({"__sources": np.array(sources)},
+                         {name: np.concatenate(parts) for name, parts in numeric.items()},
+                         {name: np.concatenate(parts) for name, parts in categorical.items()})
+        _save(os.path.join(partition, f"compact-{int(time.time() * 1000)}-{os.getpid()}.npz"), arrays)
+        for path in paths:
+            os.remove(path)
+        return len(paths)
+    finally:
+        os.remove(os.path.join(partition, ".compact.lock"))
+
+
+def compact_closed_partitions(today=None):
+    """Compacts the partitions of every day before `today` (UTC). Returns segments merged."""
+    today = today or datetime.datetime.now(datetime.timezone.utc).date()
+    merged = 0
+    for day, partition in _partitions(None, today - datetime.timedelta(days=1)):
+        count = compact_partition(partition)
+        if count:
+            logger.info("Compacted %d history segments for %s", count, day.isoformat())
+        merged += count
+    return merged
+
+
+# ------------------------------
+# 🔎 Queries
+# ------------------------------
+def _parse_day(value):
+    """ISO date string (or None) -> date; raises ValueError on bad input."""
+    return datetime.date.fromisoformat(value) if value else None
+
+
+def _partitions(start, end):
+    """(day, path) of the day partitions within [start, end] (inclusive dates)."""
+    if not os.path.isdir(HISTORY_DIR):
+        return []
+    partitions = []
+    for name in sorted(os.listdir(HISTORY_DIR)):
+        if not name.startswith("date="):
+            continue
+        day = datetime.date.fromisoformat(name[len("date="):])
+        if (start and day < start) or (end and day > end):
+            continue
+        partitions.append((day, os.path.join(HISTORY_DIR, name)))
+    return partitions
+
+
+def _list_partition(partition):
+    """(segment paths, leftover paths a compacted segment already holds) of a partition."""
+    names = sorted(f for f in os.listdir(partition) if f.endswith(".npz"))
+    replaced = set()
+    for name in names:
+        if name.startswith("compact-"):
+            with np.load(os.path.join(partition, name)) as segment:
+                replaced.update(segment["__sources"].tolist())
+    return ([os.path.join(partition, name) for name in names if name not in replaced],
+            [os.path.join(partition, name) for name in names if name in replaced])
+
+
+def _partition_segments(partition):
+    return _list_partition(partition)[0]
+
+
+def _read_partition(partition, columns):
+    """{column: [array per segment]} of one partition."""
+    parts = {c: [] for c in columns}
+    for path in _partition_segments(partition):
+        with np.load(path) as segment:
+            for column in columns:
+                if column in CATEGORICAL_COLUMNS:
+                    parts[column].append(segment[f"{column}__vocab"][segment[column]])
+                else:
+                    parts[column].append(segment[column])
+    return parts
+
+
+def scan(columns, start=None, end=None):
+    """
+    Reads only `columns` from the partitions between the ISO dates `start`
+    and `end` (inclusive). Returns {column: array}; categorical columns are
+    decoded to strings. Raises ValueError for unknown columns or bad dates.
+    """
+    unknown = set(columns) - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown history columns: {', '.join(sorted(unknown))}")
+
+    parts = {c: [] for c in columns}
+    for _, partition in _partitions(_parse_day(start), _parse_day(end)):
+        for attempt in range(3):
+            try:
+                partition_parts = _read_partition(partition, columns)
+                break
+            except FileNotFoundError:
+                # Compacted while we read it: list the partition again
+                if attempt == 2:
+                    raise
+        for column in columns:
+            parts[column].extend(partition_parts[column])
+
+    dtypes = dict(NUMERIC_COLUMNS)
+    return {c: np.concatenate(p) if p else np.array([], dtype=dtypes.get(c, str))
+            for c, p in parts.items()}
+
+
+def crop_distribution(start=None, end=None, region_degrees=1.0):
+    """
+    Recommendation counts per (ISO week, region, crop). Regions are
+    `region_degrees` lat/lon grid cells ("unknown" when no location).
+    """
+    data = scan(('ts', 'latitude', 'longitude', 'crop'), start, end)
+    if len(data['ts']) == 0:
+        return {"total": 0, "groups": []}
+
+    # Label weeks and regions once per distinct day / grid cell, group on integer codes
+    days, day_index = np.unique((data['ts'] // 86400).astype(np.int64), return_inverse=True)
+    epoch = datetime.date(1970, 1, 1).toordinal()
+    weeks = ["{}-W{:02d}".format(*datetime.date.fromordinal(epoch + int(d)).isocalendar()[:2]) for d in days]
+
+    cells = np.stack([np.floor(data['latitude'].astype(float) / region_degrees),
+                      np.floor(data['longitude'].astype(float) / region_degrees)], axis=1)
+    # NaN never compares equal, so rows without a location share an inf cell
+    cells, cell_index = np.unique(np.nan_to_num(cells, nan=np.inf), axis=0, return_inverse=True)
+    regions = ["unknown" if np.isinf(lat) else f"{round(lat * region_degrees, 4)},{round(lon * region_degrees, 4)}"
+               for lat, lon in cells.tolist()]
+
+    frame = pd.DataFrame({"week": day_index.ravel(), "region": cell_index.ravel(), "crop": data['crop']})
+    counts = frame.groupby(["week", "region", "crop"]).size().reset_index(name="count")
+    counts["week"] = np.array(weeks)[counts["week"]]
+    counts["region"] = np.array(regions)[counts["region"]]
+    counts = counts.sort_values(["week", "region", "count"], ascending=[True, True, False])
+    return {"total": len(frame), "groups": counts.to_dict(orient="records")}
+
+
+def _training_features():
+    global _training
+    if _training is None:
+        _training = pd.read_csv(TRAINING_DATA_PATH, usecols=FEATURE_COLUMNS)[FEATURE_COLUMNS]
+    return _training
+
+
+def _summary(values):
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {"mean": round(float(values.mean()), 3), "std": round(float(values.std()), 3),
+            "p10": round(float(p10), 3), "p50": round(float(p50), 3), "p90": round(float(p90), 3)}
+
+
+def input_drift(start=None, end=None):
+    """
+    Per-feature summary of served inputs against the training data, with
+    the mean shift in training standard deviations and the share of inputs
+    outside the training range.
+    """
+    data = scan(FEATURE_COLUMNS, start, end)
+    rows = len(data[FEATURE_COLUMNS[0]])
+    if rows == 0:
+        return {"rows": 0, "features": {}}
+
+    training = _training_features()
+    features = {}
+    for column in FEATURE_COLUMNS:
+        served = data[column].astype(float)
+        reference = training[column].to_numpy()
+        low, high = reference.min(), reference.max()
+        features[column] = {
+            "served": _summary(served),
+            "training": _summary(reference),
+            "mean_shift_std": round(float((served.mean() - reference.mean()) / reference.std()), 3),
+            "out_of_range_ratio": round(float(((served < low) | (served > high)).mean()), 4),
+        }
+    return {"rows": rows, "features": features}
@@ -0,0 +1,130 @@
+"""
+HTTP caching and compression for deterministic responses.
+
+Manual recommendations are a pure function of their inputs and the model
+version, and chatbot answers of the normalised query and the knowledge
+base version. Their strong ETags are therefore derived from a hash of
+exactly that content, which lets a request be answered before any work
+is done:
+
+* GET requests whose If-None-Match lists the ETag get a 304;
+* otherwise the result is looked up in a small in-process LRU keyed by
+  the ETag and only computed on a miss.
+
+GET responses carry Cache-Control so browsers and a local reverse proxy
+can reuse them. Large batch responses are gzip- or brotli-encoded
+(brotli only when the optional `brotli` package is installed).
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response
+
+from app.metrics import timed, record_cache_lookup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HTTP_CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", "300"))
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "4096"))
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+# Low brotli qualities compress about as fast as gzip -6 and still smaller
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+# Preference order when the client accepts several encodings equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def content_etag(version, *parts):
+    """
+    Strong ETag (unquoted) for a response fully determined by `parts` under
+    `version`; parts must be JSON-serialisable and already normalised.
+    """
+    content = json.dumps([version, *parts], separators=(",", ":"), default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+class ResponseCache:
+    """Thread-safe LRU of computed results keyed by ETag (capacity 0 disables it)."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        if self.capacity <= 0:
+            return None
+        with self._lock:
+            result = self._entries.get(etag)
+            if result is not None:
+                self._entries.move_to_end(etag)
+        record_cache_lookup("responses", result is not None)
+        return result
+
+    def put(self, etag, result):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[etag] = result
+            self._entries.move_to_end(etag)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+
+# ------------------------------
+# 🏷️ Conditional requests
+# ------------------------------
+def is_not_modified(request, etag):
+    """True when a GET/HEAD request's If-None-Match already holds `etag`."""
+    return request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(etag)
+
+
+def cacheable(response, etag, method):
+    """Adds the ETag, and for GET/HEAD the Cache-Control that lets shared caches store it."""
+    response.set_etag(etag)
+    if method in ("GET", "HEAD"):
+        response.headers["Cache-Control"] = f"public, max-age={HTTP_CACHE_MAX_AGE}"
+    return response
+
+
+def not_modified(etag, method):
+    """Empty 304 response for a matching If-None-Match."""
+    return cacheable(Response(status=304), etag, method)
+
+
+# ------------------------------
+# 🗜️ Compression
+# ------------------------------
+def compress(response, accept_encodings):
+    """
+    Encodes a 200 response body of at least COMPRESS_MIN_BYTES with the best
+    encoding the client accepts (brotli, then gzip); otherwise returns it as is.
+    """
+    response.vary.add("Accept-Encoding")
+    if response.status_code != 200 or response.direct_passthrough or "Content-Encoding" in response.headers:
+        return response
+    encoding = accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    with timed("compress"):
+        if encoding == "br":
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
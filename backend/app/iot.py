@@ -0,0 +1,170 @@
+"""
+Streaming ingestion of IoT soil-sensor readings.
+
+Readings (N, P, K, ph) are keyed by field and sensor. Each field keeps a
+fixed-size NumPy ring buffer of its most recent readings; the rolling mean
+is maintained incrementally (running sums minus evicted rows) and the
+rolling median is refreshed once per ingested batch, so reading the latest
+aggregate from the request path is O(1) and memory stays bounded.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+CHANNELS = ('N', 'P', 'K', 'ph')
+IOT_WINDOW = int(os.environ.get("IOT_WINDOW", "256"))
+IOT_MAX_FIELDS = int(os.environ.get("IOT_MAX_FIELDS", "10000"))
+IOT_MAX_SENSORS_PER_FIELD = 64
+
+
+class FieldBuffer:
+    """Ring buffer of the last `window` readings for one field."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = np.full((window, len(CHANNELS)), np.nan)
+        self.position = 0
+        self.sums = np.zeros(len(CHANNELS))
+        self.counts = np.zeros(len(CHANNELS), dtype=np.int64)
+        self.total_readings = 0
+        self.sensors = OrderedDict()
+        self.aggregate = None
+        self._lock = threading.Lock()
+
+    def append(self, block, sensor_ids, received_at):
+        """Appends an (n, len(CHANNELS)) block of readings, NaN marking missing values."""
+        with self._lock:
+            n = len(block)
+            if n > self.window:
+                block = block[-self.window:]
+            slots = (self.position + np.arange(len(block))) % self.window
+
+            evicted = self.values[slots]
+            evicted_present = ~np.isnan(evicted)
+            self.sums -= np.where(evicted_present, evicted, 0.0).sum(axis=0)
+            self.counts -= evicted_present.sum(axis=0)
+
+            present = ~np.isnan(block)
+            self.sums += np.where(present, block, 0.0).sum(axis=0)
+            self.counts += present.sum(axis=0)
+
+            self.values[slots] = block
+            self.position = (self.position + len(block)) % self.window
+            self.total_readings += n
+
+            for sensor_id in sensor_ids:
+                self.sensors[sensor_id] = received_at
+                self.sensors.move_to_end(sensor_id)
+            while len(self.sensors) > IOT_MAX_SENSORS_PER_FIELD:
+                self.sensors.popitem(last=False)
+
+            self.aggregate = self._build_aggregate(received_at)
+
+    def _build_aggregate(self, updated_at):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.sums / self.counts
+        medians = np.full(len(CHANNELS), np.nan)
+        has_values = self.counts > 0
+        if has_values.any():
+            medians[has_values] = np.nanmedian(self.values[:, has_values], axis=0)
+
+        def to_dict(array):
+            return {channel: round(float(value), 3)
+                    for channel, value, ok in zip(CHANNELS, array, has_values) if ok}
+
+        return {
+            "mean": to_dict(means),
+            "median": to_dict(medians),
+            "samples": {channel: int(count) for channel, count in zip(CHANNELS, self.counts)},
+            "total_readings": self.total_readings,
+            "sensors": len(self.sensors),
+            "updated_at": updated_at,
+        }
+
+
+_fields = OrderedDict()
+_fields_lock = threading.Lock()
+
+
+def _get_buffer(field_id):
+    with _fields_lock:
+        buffer = _fields.get(field_id)
+        if buffer is None:
+            buffer = _fields[field_id] = FieldBuffer(IOT_WINDOW)
+            if len(_fields) > IOT_MAX_FIELDS:
+                _fields.popitem(last=False)
+        else:
+            _fields.move_to_end(field_id)
+        return buffer
+
+
+def _to_float(value):
+    if value is None:
+        return math.nan
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError("non-finite reading")
+    return value
+
+
+def ingest(readings):
+    """
+    Ingests an iterable of reading dicts:
+        { field_id, sensor_id?, N?, P?, K?, ph? }
+    Returns counts of accepted/rejected readings and fields touched.
+    """
+    grouped = {}
+    rejected = 0
+    for reading in readings:
+        try:
+            field_id = str(reading['field_id'])
+            row = [_to_float(reading.get(channel)) for channel in CHANNELS]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            rejected += 1
+            continue
+        rows, sensors = grouped.setdefault(field_id, ([], set()))
+        rows.append(row)
+        sensors.add(str(reading.get('sensor_id', 'default')))
+
+    received_at = time.time()
+    accepted = 0
+    for field_id, (rows, sensors) in grouped.items():
+        _get_buffer(field_id).append(np.asarray(rows, dtype=float), sensors, received_at)
+        accepted += len(rows)
+
+    return {"accepted": accepted, "rejected": rejected, "fields": len(grouped)}
+
+
+def parse_ndjson(body):
+    """Yields one reading per non-empty line of an NDJSON payload (bad lines yield None)."""
+    for line in body.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def field_aggregate(field_id):
+    """Latest rolling aggregate for a field, or None if it has no readings."""
+    with _fields_lock:
+        buffer = _fields.get(str(field_id))
+    return buffer.aggregate if buffer is not None else None
+
+
+def latest_soil(field_id, statistic="median"):
+    """
+    Latest soil values for a field in the iot_sensor_data shape used by
+    recommend_crop_live(): {'N': val, 'P': val, 'K': val, 'ph': val}.
+    """
+    aggregate = field_aggregate(field_id)
+    if aggregate is None:
+        return None
+    return dict(aggregate[statistic]) or None
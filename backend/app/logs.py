@@ -0,0 +1,222 @@
+"""
+Structured, non-blocking logging for the API.
+
+Request threads only build a LogRecord and put it on a bounded queue; a
+QueueListener thread formats it (JSON by default) and writes it to
+stderr, so a slow terminal or log shipper never stalls a request. When
+the queue is full the record is dropped and counted instead of blocking.
+
+Every record carries the current request ID, and the per-request access
+line ("app.access") also carries the timings of each metrics.timed()
+stage the request went through.
+
+Configuration (environment):
+    LOG_LEVEL      root level (default INFO)
+    LOG_LEVELS     per-module levels, e.g. "api.weather_api=WARNING,app.utils=DEBUG"
+    LOG_SAMPLE     keep-rates for INFO/DEBUG records per logger prefix,
+                   e.g. "app.access=0.1,app.utils=0.05"; a request is kept or
+                   dropped as a whole, warnings and errors are never sampled
+    LOG_FORMAT     json (default) or text
+    LOG_QUEUE_MAX  records buffered for the writer thread (default 10000)
+"""
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+import zlib
+
+from app.metrics import add_stage_listener, LOG_RECORDS
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+LOG_SAMPLE = os.environ.get("LOG_SAMPLE", "")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_QUEUE_MAX = int(os.environ.get("LOG_QUEUE_MAX", "10000"))
+REQUEST_ID_HEADER = "X-Request-Id"
+
+# Incoming request IDs are echoed back, so only accept short, log-safe tokens
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+# Attributes every LogRecord has; anything else came in through extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_request_context = contextvars.ContextVar("request_log_context", default=None)
+_listener = None
+access_logger = logging.getLogger("app.access")
+
+
+def _parse_pairs(spec):
+    """"a=1,b=2" -> {"a": "1", "b": "2"} (blank entries ignored)."""
+    pairs = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+class RequestContext:
+    """Request ID and stage timings of the request being handled."""
+
+    def __init__(self, request_id):
+        self.id = request_id
+        self.start = time.perf_counter()
+        self.stages = []
+        self._token = None
+
+    def add_stage(self, stage, start, duration):
+        self.stages.append({"stage": stage, "duration_ms": round(duration * 1000, 3)})
+
+
+def _record_stage(stage, start, duration):
+    context = _request_context.get()
+    if context is not None:
+        context.add_stage(stage, start, duration)
+
+
+add_stage_listener(_record_stage)
+
+
+# ------------------------------
+# 📤 Queue handler (request thread side)
+# ------------------------------
+class _SamplingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue, sample_rates):
+        super().__init__(log_queue)
+        # Longest prefix first so "app.utils.x" beats "app"
+        self.sample_rates = sorted(((name, float(rate)) for name, rate in sample_rates.items()),
+                                   key=lambda item: -len(item[0]))
+
+    def _keep(self, record, context):
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.sample_rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                if rate >= 1:
+                    return True
+                # Hash the request ID so all lines of a request are kept together
+                if context is not None:
+                    return (zlib.crc32(context.id.encode()) & 0xffffffff) / 2 ** 32 < rate
+                return random.random() < rate
+        return True
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, while args and exc_info are
+        # still valid; JSON formatting happens on the listener thread
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        context = _request_context.get()
+        if not self._keep(record, context):
+            LOG_RECORDS.inc("sampled_out")
+            return
+        if context is not None and not hasattr(record, "request_id"):
+            record.request_id = context.id
+        try:
+            self.enqueue(self.prepare(record))
+            LOG_RECORDS.inc("queued")
+        except queue.Full:
+            LOG_RECORDS.inc("dropped")
+        except Exception:
+            self.handleError(record)
+
+
+# ------------------------------
+# 🧾 Formatters (listener thread side)
+# ------------------------------
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id and any extra fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                  .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return super().format(record)
+
+
+def configure():
+    """
+    Routes all logging through the queue handler and starts the writer
+    thread. Safe to call more than once; only the first call takes effect.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+    _listener = logging.handlers.QueueListener(log_queue, stream)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers[:] = [_SamplingQueueHandler(log_queue, _parse_pairs(LOG_SAMPLE))]
+    root.setLevel(LOG_LEVEL)
+    # The dev server's own access lines would duplicate "app.access"
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    for name, level in _parse_pairs(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+
+# ------------------------------
+# 🔖 Request scope
+# ------------------------------
+def request_id_from(headers):
+    """The caller's X-Request-Id when it is a safe token, else a fresh ID."""
+    request_id = headers.get(REQUEST_ID_HEADER)
+    if request_id and _REQUEST_ID_PATTERN.match(request_id):
+        return request_id
+    return uuid.uuid4().hex[:16]
+
+
+def start_request(request_id):
+    """Makes `request_id` the context of every record logged until finish_request()."""
+    context = RequestContext(request_id)
+    context._token = _request_context.set(context)
+    return context
+
+
+def finish_request(context, method, route, status):
+    """Writes the access line (with stage timings) and leaves the request context."""
+    if access_logger.isEnabledFor(logging.INFO):
+        access_logger.info("%s %s %s", method, route, status, extra={
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round((time.perf_counter() - context.start) * 1000, 3),
+            "stages": context.stages,
+        })
+    _request_context.reset(context._token)
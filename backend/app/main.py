@@ -1,7 +1,10 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 import sys
 import os
+import time
+import hashlib
+import logging
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
@@ -12,7 +15,25 @@ import numpy as np
 # Add parent directory to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.utils import recommend_crop_live, recommend_crop_manual, get_current_location
+# Configure logging before the model/data modules log their load status
+from app import logs
+logs.configure()
+
+from app.utils import (recommend_crop_live, recommend_crop_manual, recommend_crop_batch,
+                       recommend_crop_sweep, recommend_crop_compare, get_current_location, MODEL_VERSION,
+                       parse_live_request, finish_live_result, parse_top_k, top_k_indices)
+from app.metrics import record_load_time, record_request, render_prometheus, PROMETHEUS_CONTENT_TYPE
+from app import profiling
+from app import ratelimit
+from app import iot
+from app import fields
+from app import history
+from app import monitor
+from app import httpcache
+from app import validation
+from app.optimizer import optimize_amendment
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
@@ -21,37 +42,151 @@ API_KEY = "8f96af8e0f2466de3a56b467fd29ea79"
 
 # Load Chatbot Data
 try:
+    _load_start = time.perf_counter()
     csv_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'chatbot_data.csv')
     df = pd.read_csv(csv_path)
+    # Answers are a pure function of the query and this file
+    with open(csv_path, 'rb') as f:
+        KB_VERSION = hashlib.sha256(f.read()).hexdigest()[:12]
     questions = df['question'].tolist()
     answers = df['answer'].tolist()
     
     # Initialize Vectorizer
     vectorizer = TfidfVectorizer()
     tfidf_matrix = vectorizer.fit_transform(questions)
-    print("✅ Chatbot data loaded and vectorized successfully.")
+    record_load_time("chatbot", time.perf_counter() - _load_start)
+    logger.info("Chatbot data loaded and vectorized", extra={"questions": len(questions)})
 except Exception as e:
-    print(f"❌ Error loading chatbot data: {e}")
+    logger.error("Error loading chatbot data: %s", e)
     questions = []
     answers = []
     vectorizer = None
     tfidf_matrix = None
+    KB_VERSION = None
+
+# Field registry + scheduled bulk re-recommendation
+FIELD_RERUN_INTERVAL = int(os.environ.get("FIELD_RERUN_INTERVAL", "0"))
+try:
+    fields.init_db()
+    fields.start_scheduler(API_KEY, FIELD_RERUN_INTERVAL)
+except Exception as e:
+    logger.error("Error initializing field registry: %s", e)
+
+# Periodic input-drift evaluation (window counts vs. training histograms)
+monitor.start_evaluator(monitor.DRIFT_EVAL_SECONDS)
+
+# Chatbot answer selection
+CHAT_RELEVANCE_THRESHOLD = 0.2
+CHAT_FALLBACK_RESPONSE = "I'm sorry, I don't have information on that specific topic yet. Please try asking about crops, soil, or farming practices."
+CHAT_BATCH_MAX_QUERIES = 10000
+CHAT_BATCH_MAX_TOP_K = 10
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.request_log = logs.start_request(logs.request_id_from(request.headers))
+    g.profile = profiling.start_profile(request.headers, request.method, request.path)
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # Label by URL rule (not raw path) to keep cardinality bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        record_request(route, request.method, response.status_code, time.perf_counter() - start)
+    # Shared caches would hand one request's IDs to every client, so public responses go without them
+    per_request_headers = not response.cache_control.public
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile_id = profiling.finish_profile(profile, response.status_code)
+        if per_request_headers:
+            response.headers['X-Profile-Id'] = profile_id
+    request_log = g.pop('request_log', None)
+    if request_log is not None:
+        if per_request_headers:
+            response.headers[logs.REQUEST_ID_HEADER] = request_log.id
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        logs.finish_request(request_log, request.method, route, response.status_code)
+    return response
+
+def _too_many_requests(error, retry_after):
+    response = jsonify({"success": False, "error": error})
+    response.status_code = 429
+    response.headers['Retry-After'] = ratelimit.retry_after_header(retry_after)
+    return response
+
+def _check_client_rate_limit():
+    """Returns a 429 response when the calling client is over its live-request rate, else None"""
+    client = ratelimit.client_id(request.headers, request.remote_addr)
+    allowed, retry_after = ratelimit.CLIENT_LIMITER.try_acquire(client)
+    if not allowed:
+        return _too_many_requests("Rate limit exceeded", retry_after)
+    return None
+
+def _flag(value):
+    """JSON booleans as-is; query-string flags are true for 1/true/yes"""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({"status": "healthy", "message": "Crop Recommendation API is running"})
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: per-stage and per-route latency, upstream errors, cache hit ratios"""
+    return render_prometheus(), 200, {"Content-Type": PROMETHEUS_CONTENT_TYPE}
+
+@app.route('/api/limits', methods=['GET'])
+def limits_status():
+    """Current upstream budgets, per-client limits and live in-flight count"""
+    return jsonify({"success": True, **ratelimit.status()})
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """List stored request profiles (requires the profiling admin token)"""
+    if not profiling.is_admin(request.headers):
+        return jsonify({"success": False, "error": "Profiling admin token required"}), 403
+    return jsonify({"success": True, "profiles": profiling.list_profiles()})
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """
+    Fetch one stored profile as JSON, or as collapsed stacks for
+    flamegraph tools with ?format=collapsed
+    """
+    if not profiling.is_admin(request.headers):
+        return jsonify({"success": False, "error": "Profiling admin token required"}), 403
+
+    profile = profiling.load_profile(profile_id)
+    if profile is None:
+        return jsonify({"success": False, "error": "Profile not found"}), 404
+
+    if request.args.get('format') == 'collapsed':
+        return profiling.to_collapsed(profile), 200, {"Content-Type": "text/plain; charset=utf-8"}
+    profile["success"] = True
+    return jsonify(profile)
+
 @app.route("/")
 def index():
     return {"status": "ok", "service": "crop-backend"}, 200    
 
-@app.route('/api/chat', methods=['POST'])
+@app.route('/api/chat', methods=['GET', 'POST'])
 def chat():
-    """Chatbot endpoint using TF-IDF and Cosine Similarity"""
+    """
+    Chatbot endpoint using TF-IDF and Cosine Similarity
+    POST body: { query }  |  cacheable GET: ?query=...
+    """
     try:
-        data = request.json
-        user_query = data.get('query', '').strip()
+        data = request.json if request.method == 'POST' else request.args
+        if not isinstance(data, dict):
+            return jsonify({"success": False, "error": "Request body must be a JSON object"}), 400
+        user_query = data.get('query', '')
+        if not isinstance(user_query, str):
+            return jsonify({"success": False, "error": "query must be a string"}), 400
+        user_query = user_query.strip()
         
         if not user_query:
             return jsonify({"success": False, "error": "Query is required"}), 400
@@ -59,28 +194,106 @@ def chat():
         if vectorizer is None or tfidf_matrix is None:
             return jsonify({"success": False, "error": "Chatbot is not initialized"}), 500
 
-        # Vectorize user query
-        user_tfidf = vectorizer.transform([user_query])
-        
-        # Calculate cosine similarity
-        similarities = cosine_similarity(user_tfidf, tfidf_matrix).flatten()
-        
-        # Find best match
-        best_match_index = np.argmax(similarities)
-        best_score = similarities[best_match_index]
+        # The vectorizer lowercases and tokenizes on words, so case and
+        # spacing never change the answer
+        etag = httpcache.content_etag(KB_VERSION, "chat", " ".join(user_query.lower().split()))
+        if httpcache.is_not_modified(request, etag):
+            return httpcache.not_modified(etag, request.method)
+
+        result = httpcache.response_cache.get(etag)
+        if result is None:
+            # Vectorize user query
+            user_tfidf = vectorizer.transform([user_query])
+
+            # Calculate cosine similarity
+            similarities = cosine_similarity(user_tfidf, tfidf_matrix).flatten()
+
+            # Find best match
+            best_match_index = np.argmax(similarities)
+            best_score = similarities[best_match_index]
+
+            # Threshold for relevance (adjust as needed)
+            if best_score > CHAT_RELEVANCE_THRESHOLD:
+                response = answers[best_match_index]
+            else:
+                response = CHAT_FALLBACK_RESPONSE
+
+            result = {
+                "success": True,
+                "response": response,
+                "score": float(best_score)
+            }
+            httpcache.response_cache.put(etag, result)
+
+        return httpcache.cacheable(jsonify(result), etag, request.method)
         
-        # Threshold for relevance (adjust as needed)
-        if best_score > 0.2:
-            response = answers[best_match_index]
-        else:
-            response = "I'm sorry, I don't have information on that specific topic yet. Please try asking about crops, soil, or farming practices."
-            
+    except Exception as e:
         return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """
+    Batch chatbot endpoint: scores every query with one sparse matrix product
+    Request body: { queries: [str, ...], top_k?: int }
+    """
+    try:
+        data = request.json
+        if not isinstance(data, dict):
+            return jsonify({"success": False, "error": "Request body must be a JSON object"}), 400
+        queries = data.get('queries')
+        try:
+            top_k = parse_top_k(data.get('top_k', 1), CHAT_BATCH_MAX_TOP_K)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        if not isinstance(queries, list) or not queries:
+            return jsonify({"success": False, "error": "queries must be a non-empty list"}), 400
+        if len(queries) > CHAT_BATCH_MAX_QUERIES:
+            return jsonify({"success": False, "error": f"At most {CHAT_BATCH_MAX_QUERIES} queries per batch"}), 400
+
+        if vectorizer is None or tfidf_matrix is None:
+            return jsonify({"success": False, "error": "Chatbot is not initialized"}), 500
+
+        # Non-string entries (null, numbers, objects) get a per-item error, not a search
+        texts = [q.strip() if isinstance(q, str) else "" for q in queries]
+
+        # TF-IDF rows are L2-normalised, so the sparse dot product is the cosine similarity
+        query_tfidf = vectorizer.transform(texts)
+        similarities = (query_tfidf @ tfidf_matrix.T).toarray()
+
+        # Top-k per row without a full sort
+        top_idx, top_scores = top_k_indices(similarities, top_k)
+
+        results = []
+        for original, query, idx_row, score_row in zip(queries, texts, top_idx.tolist(), top_scores.tolist()):
+            if not isinstance(original, str):
+                results.append({"success": False, "error": "Query must be a string"})
+                continue
+            if not query:
+                results.append({"success": False, "error": "Query is required"})
+                continue
+
+            matches = [
+                {"response": answers[i], "score": float(score)}
+                for i, score in zip(idx_row, score_row)
+                if score > CHAT_RELEVANCE_THRESHOLD
+            ]
+            results.append({
+                "success": True,
+                "response": matches[0]["response"] if matches else CHAT_FALLBACK_RESPONSE,
+                "score": float(score_row[0]),
+                "matches": matches
+            })
+
+        return httpcache.compress(jsonify({
             "success": True,
-            "response": response,
-            "score": float(best_score)
-        })
-        
+            "count": len(results),
+            "results": results
+        }), request.accept_encodings)
+
     except Exception as e:
         return jsonify({
             "success": False,
@@ -90,6 +303,10 @@ def chat():
 @app.route('/api/location', methods=['GET'])
 def detect_location():
     """Detect current location"""
+    rejection = _check_client_rate_limit()
+    if rejection is not None:
+        return rejection
+
     try:
         lat, lon, city, country = get_current_location()
         return jsonify({
@@ -111,59 +328,328 @@ def detect_location():
 def recommend_live():
     """
     Live mode: Auto-detect location and fetch weather
-    Request body: { N, P, K, ph, useCurrentLocation, latitude?, longitude? }
+    Request body: { N, P, K, ph, useCurrentLocation, latitude?, longitude?, field_id?, top_k?, explain? }
+    When field_id has IoT readings, their rolling medians replace N/P/K/ph.
+    """
+    client = ratelimit.client_id(request.headers, request.remote_addr)
+    rejection = ratelimit.admit_live(client, ratelimit.LIVE_INFLIGHT)
+    if rejection is not None:
+        return _too_many_requests(*rejection)
+
+    try:
+        try:
+            live = parse_live_request(request.json)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        location = live.pop("location") or get_current_location()
+        result = recommend_crop_live(lat=location[0], lon=location[1], api_key=API_KEY, **live)
+
+        if "error" in result:
+            return jsonify({
+                "success": False,
+                "error": result["error"]
+            }), 400
+
+        return jsonify(finish_live_result(result, location, time.perf_counter() - g.request_start))
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+    finally:
+        ratelimit.LIVE_INFLIGHT.leave()
+
+@app.route('/api/recommend/batch', methods=['POST'])
+def recommend_batch():
+    """
+    Batch mode: many manual inputs scored in one vectorized pass
+    Request body: { inputs: [{ N, P, K, temperature, humidity, ph, rainfall }, ...], top_k?, explain? }
     """
     try:
         data = request.json
-        
-        N = float(data.get('N'))
-        P = float(data.get('P'))
-        K = float(data.get('K'))
-        ph = float(data.get('ph'))
-        
-        # Get location
-        if data.get('useCurrentLocation', True):
-            lat, lon, city, country = get_current_location()
-        else:
-            lat = float(data.get('latitude', 30.9))
-            lon = float(data.get('longitude', 75.8))
-            city = data.get('city', 'Unknown')
-            country = data.get('country', 'Unknown')
-        
-        # Get recommendation
-        result = recommend_crop_live(N, P, K, ph, lat, lon, API_KEY)
-        
+        try:
+            top_k = parse_top_k(data.get('top_k'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        result = recommend_crop_batch(data.get('inputs'), top_k, bool(data.get('explain', False)))
+
         if "error" in result:
             return jsonify({
                 "success": False,
                 "error": result["error"]
             }), 400
-        
-        # Add location info to result
-        result["location"] = {
-            "city": city,
-            "country": country,
-            "latitude": lat,
-            "longitude": lon
-        }
+
+        result["success"] = True
+        return httpcache.compress(jsonify(result), request.accept_encodings)
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/recommend/sweep', methods=['POST'])
+def recommend_sweep():
+    """
+    What-if sweep: vary one or two features around a base input
+    Request body: { base: { N, P, K, temperature, humidity, ph, rainfall },
+                    axes: [{ feature, start, stop, steps }, ...] }
+    """
+    try:
+        data = request.json
+        if not isinstance(data, dict):
+            return jsonify({"success": False, "error": "Request body must be a JSON object"}), 400
+        result = recommend_crop_sweep(data.get('base') or {}, data.get('axes'))
+
+        if "error" in result:
+            return jsonify({
+                "success": False,
+                "error": result["error"]
+            }), 400
+
         result["success"] = True
-        
         return jsonify(result)
-        
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/recommend/compare', methods=['POST'])
+def recommend_compare():
+    """
+    Compare mode: one soil profile (or one per location) across many coordinates
+    Request body: { locations: [{ latitude, longitude, N?, P?, K?, ph? }, ...],
+                    soil?: { N, P, K, ph }, top_k? }
+    Results come back in input order; unusable locations carry an "error".
+    """
+    rejection = _check_client_rate_limit()
+    if rejection is not None:
+        return rejection
+
+    try:
+        data = request.json
+        try:
+            top_k = parse_top_k(data.get('top_k'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        result = recommend_crop_compare(data.get('locations'), API_KEY, data.get('soil'), top_k)
+
+        if "retry_after" in result:
+            return _too_many_requests(result["error"], result["retry_after"])
+        if "error" in result:
+            return jsonify({
+                "success": False,
+                "error": result["error"]
+            }), 400
+
+        result["success"] = True
+        return httpcache.compress(jsonify(result), request.accept_encodings)
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/recommend/optimize', methods=['POST'])
+def recommend_optimize():
+    """
+    Cheapest soil amendment that makes a target crop the recommendation
+    Request body: { N, P, K, temperature, humidity, ph, rainfall, target_crop,
+                    costs?: { N, P, K, ph }, time_budget_ms? }
+    """
+    try:
+        data = request.json
+        if not isinstance(data, dict):
+            return jsonify({"success": False, "error": "Request body must be a JSON object"}), 400
+        target_crop = data.get('target_crop')
+        if not target_crop:
+            return jsonify({"success": False, "error": "target_crop is required"}), 400
+        # Values are checked (numeric, finite, non-negative) by optimize_amendment
+        if data.get('costs') is not None and not isinstance(data['costs'], dict):
+            return jsonify({"success": False, "error": "costs must be an object {N, P, K, ph} of numbers"}), 400
+
+        result = optimize_amendment(
+            data,
+            target_crop,
+            costs=data.get('costs'),
+            time_budget_ms=data.get('time_budget_ms', 500)
+        )
+
+        if "error" in result:
+            return jsonify({
+                "success": False,
+                "error": result["error"]
+            }), 400
+
+        result["success"] = True
+        return jsonify(result)
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/iot/readings', methods=['POST'])
+def ingest_iot_readings():
+    """
+    Bulk IoT soil-sensor ingestion
+    Body: JSON list (or { readings: [...] }) or NDJSON (application/x-ndjson),
+    one reading per item: { field_id, sensor_id?, N?, P?, K?, ph? }
+    """
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            readings = iot.parse_ndjson(request.get_data(as_text=True))
+        else:
+            data = request.get_json(force=True)
+            readings = data.get('readings', []) if isinstance(data, dict) else data
+            if not isinstance(readings, list):
+                return jsonify({"success": False, "error": "Expected a list of readings"}), 400
+
+        summary = iot.ingest(readings)
+        summary["success"] = True
+        return jsonify(summary)
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/iot/fields/<field_id>', methods=['GET'])
+def iot_field_aggregate(field_id):
+    """Rolling mean/median of the latest IoT readings for a field"""
+    aggregate = iot.field_aggregate(field_id)
+    if aggregate is None:
+        return jsonify({"success": False, "error": "No readings for this field"}), 404
+    return jsonify({"success": True, "field_id": field_id, **aggregate})
+
+@app.route('/api/fields', methods=['POST'])
+def register_fields():
+    """
+    Register or update fields in bulk
+    Request body: { fields: [{ field_id, latitude, longitude, name?, N?, P?, K?, ph? }, ...] }
+    """
+    try:
+        data = request.json
+        items = data.get('fields')
+        if not isinstance(items, list) or not items:
+            return jsonify({"success": False, "error": "fields must be a non-empty list"}), 400
+
+        written = fields.upsert_fields(items)
+        return jsonify({"success": True, "fields": written})
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
-@app.route('/api/recommend/manual', methods=['POST'])
+@app.route('/api/fields/<field_id>', methods=['GET'])
+def get_field(field_id):
+    """Field record with its latest scheduled recommendation"""
+    field = fields.get_field(field_id)
+    if field is None:
+        return jsonify({"success": False, "error": "Field not found"}), 404
+    return jsonify({"success": True, "field": field})
+
+@app.route('/api/fields/runs', methods=['GET', 'POST'])
+def field_runs():
+    """
+    GET: recent re-recommendation runs plus progress of the current one
+    POST: start a run now (409 if one is already in progress)
+    """
+    if request.method == 'POST':
+        if not fields.start_run_in_background(API_KEY):
+            return jsonify({"success": False, "error": "A run is already in progress"}), 409
+        return jsonify({"success": True, "message": "Run started"}), 202
+
+    return jsonify({
+        "success": True,
+        "current": fields.current_progress(),
+        "runs": fields.list_runs()
+    })
+
+@app.route('/api/history/crops', methods=['GET'])
+def history_crops():
+    """
+    Recommendation counts per ISO week, region and crop
+    Query: ?start=YYYY-MM-DD&end=YYYY-MM-DD&region_degrees=1.0
+    """
+    try:
+        region_degrees = float(request.args.get('region_degrees', 1.0))
+        if region_degrees <= 0:
+            return jsonify({"success": False, "error": "region_degrees must be positive"}), 400
+
+        result = history.crop_distribution(request.args.get('start'), request.args.get('end'), region_degrees)
+        result["success"] = True
+        return jsonify(result)
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/history/drift', methods=['GET'])
+def history_drift():
+    """
+    Served inputs vs. the training data, per feature
+    Query: ?start=YYYY-MM-DD&end=YYYY-MM-DD
+    """
+    try:
+        result = history.input_drift(request.args.get('start'), request.args.get('end'))
+        result["success"] = True
+        return jsonify(result)
+
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/monitor/drift', methods=['GET'])
+def monitor_drift():
+    """
+    Input-drift / model-health report of the last evaluation window and its alerts
+    Query: ?evaluate=1 scores the pending window now (even if below the minimum size);
+    it resets the window, so it requires the profiling admin token
+    """
+    if monitor.monitor is None:
+        return jsonify({"success": False, "error": "Drift monitor not available"}), 503
+
+    if request.args.get('evaluate') == '1':
+        if not profiling.is_admin(request.headers):
+            return jsonify({"success": False, "error": "Profiling admin token required to force an evaluation"}), 403
+        monitor.monitor.evaluate(force=True)
+    status = monitor.monitor.status()
+    report = status["last_report"] or {}
+    return jsonify({
+        "success": True,
+        "alerts": report.get("alerts", []),
+        **status
+    })
+
+@app.route('/api/recommend/manual', methods=['GET', 'POST'])
 def recommend_manual():
     """
     Manual mode: All data provided by user
-    Request body: { N, P, K, temperature, humidity, ph, rainfall }
+    Request body: { N, P, K, temperature, humidity, ph, rainfall, top_k?, explain? }
+    Cacheable GET: the same fields as query parameters
     """
     try:
-        data = request.json
+        data = request.json if request.method == 'POST' else request.args
         
         N = float(data.get('N'))
         P = float(data.get('P'))
@@ -172,18 +658,36 @@ def recommend_manual():
         humidity = float(data.get('humidity'))
         ph = float(data.get('ph'))
         rainfall = float(data.get('rainfall'))
-        
+        try:
+            top_k = parse_top_k(data.get('top_k'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        explain = _flag(data.get('explain', False))
+
+        etag = httpcache.content_etag(MODEL_VERSION, "manual", validation.cache_key(),
+                                      N, P, K, temperature, humidity, ph, rainfall, top_k, explain)
+        if httpcache.is_not_modified(request, etag):
+            return httpcache.not_modified(etag, request.method)
+
         # Get recommendation
-        result = recommend_crop_manual(N, P, K, temperature, humidity, ph, rainfall)
-        
-        if "error" in result:
-            return jsonify({
-                "success": False,
-                "error": result["error"]
-            }), 400
-        
-        result["success"] = True
-        return jsonify(result)
+        result = httpcache.response_cache.get(etag)
+        if result is None:
+            result = recommend_crop_manual(N, P, K, temperature, humidity, ph, rainfall, top_k, explain)
+
+            if "error" in result:
+                return jsonify({
+                    "success": False,
+                    "error": result["error"]
+                }), 400
+
+            result["success"] = True
+            httpcache.response_cache.put(etag, result)
+        else:
+            # A cache hit is still a served prediction: the drift monitor must see it
+            monitor.observe([N, P, K, temperature, humidity, ph, rainfall], result["recommended_crop"])
+
+        history.record(result, time.perf_counter() - g.request_start)
+        return httpcache.cacheable(jsonify(result), etag, request.method)
         
     except Exception as e:
         return jsonify({
@@ -199,9 +703,22 @@ if __name__ == '__main__':
     print("📋 API Endpoints:")
     print("  • GET  /api/health          - Health check")
     print("  • GET  /api/location        - Detect location")
-    print("  • POST /api/chat            - AI Chatbot")
+    print("  • GET  /api/metrics         - Prometheus metrics")
+    print("  • GET  /api/limits          - Rate limit / upstream budget status")
+    print("  • GET/POST /api/chat        - AI Chatbot (GET is cacheable)")
+    print("  • POST /api/chat/batch      - AI Chatbot (bulk queries)")
     print("  • POST /api/recommend/live  - Live mode recommendation")
-    print("  • POST /api/recommend/manual - Manual mode recommendation")
+    print("  • GET/POST /api/recommend/manual - Manual mode recommendation (GET is cacheable)")
+    print("  • POST /api/recommend/batch - Batch manual recommendations")
+    print("  • POST /api/recommend/sweep - What-if sensitivity sweep")
+    print("  • POST /api/recommend/compare - Compare many candidate locations")
+    print("  • POST /api/recommend/optimize - Cheapest amendment for a target crop")
+    print("  • POST /api/iot/readings    - Bulk IoT soil-sensor ingestion")
+    print("  • POST /api/fields          - Register fields")
+    print("  • POST /api/fields/runs     - Re-recommend all fields")
+    print("  • GET  /api/history/crops   - Crop distribution by week and region")
+    print("  • GET  /api/history/drift   - Served inputs vs. training data")
+    print("  • GET  /api/monitor/drift   - Streaming drift scores and alerts")
     print("\n" + "="*60 + "\n")
     
     app.run(debug=True, host='0.0.0.0', port=5001)
@@ -0,0 +1,295 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Each observation is a bisect plus a few additions under a lock, so the
+instrumentation can stay enabled on the request path in production.
+Exposed by the Flask app at GET /api/metrics.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets (seconds) covering in-process stages up to slow upstream APIs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+# Callables notified as (stage, start, duration) after every timed() block
+_stage_listeners = []
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        lines = self._header()
+        for label_values, value in self.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, label_names=(), callback=None):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+        # Optional callable returning {label_values: value}, evaluated at scrape time
+        self._callback = callback
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            values = dict(self._values)
+        if self._callback is not None:
+            values.update(self._callback())
+        for label_values, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label_values -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in self._series.items()]
+        for label_values, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, label_values, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# ------------------------------
+# 📊 Metric definitions
+# ------------------------------
+STAGE_LATENCY = Histogram(
+    "crop_stage_duration_seconds",
+    "Latency of each recommendation pipeline stage.",
+    ("stage",),
+)
+ROUTE_LATENCY = Histogram(
+    "crop_http_request_duration_seconds",
+    "Latency of HTTP requests by route.",
+    ("route", "method"),
+)
+ROUTE_REQUESTS = Counter(
+    "crop_http_requests_total",
+    "HTTP requests by route and status code.",
+    ("route", "method", "status"),
+)
+UPSTREAM_ERRORS = Counter(
+    "crop_upstream_errors_total",
+    "Failed calls to upstream APIs.",
+    ("upstream",),
+)
+CACHE_REQUESTS = Counter(
+    "crop_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss).",
+    ("cache", "result"),
+)
+BUDGET_EXHAUSTED = Counter(
+    "crop_budget_exhausted_total",
+    "Requests degraded or rejected because an admission budget was exhausted.",
+    ("budget",),
+)
+
+FIELD_RUN_DURATION = Histogram(
+    "crop_field_run_duration_seconds",
+    "Duration of scheduled bulk field re-recommendation runs.",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
+FIELD_RUN_FIELDS = Counter(
+    "crop_field_run_fields_total",
+    "Fields processed by bulk re-recommendation runs, by result (scored/climatology/failed).",
+    ("result",),
+)
+FIELD_RUN_PROGRESS = Gauge(
+    "crop_field_run_progress_ratio",
+    "Fraction of fields scored in the current (or last) re-recommendation run.",
+)
+HISTORY_ROWS = Counter(
+    "crop_history_rows_total",
+    "Recommendations handled by the history writer, by result (written/dropped).",
+    ("result",),
+)
+
+FEATURE_PSI = Gauge(
+    "crop_feature_drift_psi",
+    "Population stability index of each input feature vs. training, last window.",
+    ("feature",),
+)
+FEATURE_KS = Gauge(
+    "crop_feature_drift_ks",
+    "Binned Kolmogorov-Smirnov statistic of each input feature vs. training, last window.",
+    ("feature",),
+)
+PREDICTION_PSI = Gauge(
+    "crop_prediction_drift_psi",
+    "Population stability index of the predicted-class mix vs. training, last window.",
+)
+DRIFT_ALERTS = Gauge(
+    "crop_drift_alerts",
+    "Drift alerts raised by the last evaluation, by severity.",
+    ("severity",),
+)
+VALIDATION_ROWS = Counter(
+    "crop_validation_rows_total",
+    "Input rows checked against the feature bounds, by result (accepted/flagged/rejected).",
+    ("result",),
+)
+LOG_RECORDS = Counter(
+    "crop_log_records_total",
+    "Log records handled by the queue handler, by result (queued/sampled_out/dropped).",
+    ("result",),
+)
+
+
+def _cache_hit_ratios():
+    totals = {}
+    for (cache, result), value in CACHE_REQUESTS.items():
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result == "hit" else 0), lookups + value)
+    return {(cache,): hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+
+CACHE_HIT_RATIO = Gauge(
+    "crop_cache_hit_ratio",
+    "Fraction of cache lookups that were hits since process start.",
+    ("cache",),
+    callback=_cache_hit_ratios,
+)
+LOAD_SECONDS = Gauge(
+    "crop_component_load_seconds",
+    "Time taken to load a component at startup.",
+    ("component",),
+)
+
+
+# ------------------------------
+# ⏱️ Helpers
+# ------------------------------
+@contextmanager
+def timed(stage):
+    """Records the wall time of the enclosed block as a pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_LATENCY.observe(duration, stage)
+        for listener in _stage_listeners:
+            listener(stage, start, duration)
+
+
+def add_stage_listener(listener):
+    """Registers a callable invoked as listener(stage, start, duration) for each timed() block."""
+    _stage_listeners.append(listener)
+
+
+def record_upstream_error(upstream):
+    UPSTREAM_ERRORS.inc(upstream)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def record_budget_exhausted(budget):
+    BUDGET_EXHAUSTED.inc(budget)
+
+
+def record_load_time(component, seconds):
+    LOAD_SECONDS.set(seconds, component)
+
+
+def record_request(route, method, status, seconds):
+    ROUTE_LATENCY.observe(seconds, route, method)
+    ROUTE_REQUESTS.inc(route, method, str(status))
+
+
+def render_prometheus():
+    """Renders every registered metric in Prometheus text format (0.0.4)."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,207 @@
+"""
+Incremental input-drift and model-health monitor.
+
+The predict path only bumps counters: each served row is binned per
+feature against fixed training-quantile edges and the predicted class is
+counted, so an update is O(features x bins) and memory never grows. No
+raw inputs are kept.
+
+A background thread periodically compares the counts of the current
+window with the training histograms (PSI and a binned KS statistic per
+feature, PSI of the predicted-class mix), records the scores as metrics
+and raises alerts when thresholds are crossed. The window then restarts.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.metrics import FEATURE_PSI, FEATURE_KS, PREDICTION_PSI, DRIFT_ALERTS
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TRAINING_DATA_PATH = os.path.join(BASE_DIR, "data", "Crop_recommendation.csv")
+# Same order as app.utils.FEATURE_COLUMNS (utils imports this module)
+FEATURE_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+DRIFT_BINS = int(os.environ.get("DRIFT_BINS", "10"))
+DRIFT_EVAL_SECONDS = int(os.environ.get("DRIFT_EVAL_SECONDS", "300"))
+DRIFT_MIN_SAMPLES = int(os.environ.get("DRIFT_MIN_SAMPLES", "200"))
+DRIFT_PSI_WARN = float(os.environ.get("DRIFT_PSI_WARN", "0.1"))
+DRIFT_PSI_ALERT = float(os.environ.get("DRIFT_PSI_ALERT", "0.25"))
+DRIFT_KS_ALERT = float(os.environ.get("DRIFT_KS_ALERT", "0.2"))
+# Floor for empty bins so PSI stays finite
+PSI_EPSILON = 1e-4
+
+logger = logging.getLogger(__name__)
+
+
+def _psi(expected, actual):
+    expected = np.maximum(expected, PSI_EPSILON)
+    actual = np.maximum(actual, PSI_EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+class DriftMonitor:
+    def __init__(self, training, classes, bins=DRIFT_BINS):
+        self.features = list(FEATURE_COLUMNS)
+        self.classes = np.asarray(sorted(classes))
+        self.bins = bins
+        values = training[self.features].to_numpy(dtype=float)
+
+        # Interior edges at training quantiles: roughly equal-mass training bins
+        quantiles = np.linspace(0, 1, bins + 1)[1:-1]
+        self.edges = np.quantile(values, quantiles, axis=0).T            # (features, bins - 1)
+        self.training_hist = self._fractions(self._bin_counts(values))
+        class_counts = training['label'].value_counts().reindex(self.classes, fill_value=0).to_numpy()
+        self.training_classes = class_counts / class_counts.sum()
+
+        self._lock = threading.Lock()
+        self._window = np.zeros((len(self.features), bins), dtype=np.int64)
+        self._window_classes = np.zeros(len(self.classes), dtype=np.int64)
+        self._window_started = time.time()
+        self._total = 0
+        self.last_report = None
+
+    def _bin_counts(self, matrix):
+        """(features, bins) counts of an (n, features) matrix."""
+        indices = (matrix[:, :, None] > self.edges[None]).sum(axis=2)     # (n, features)
+        flat = indices + np.arange(len(self.features)) * self.bins
+        counts = np.bincount(flat.ravel(), minlength=len(self.features) * self.bins)
+        return counts.reshape(len(self.features), self.bins)
+
+    def _class_indices(self, crops):
+        """Indices of the known crops among `crops` (unknown labels are skipped)."""
+        crops = np.asarray(crops).astype(str)
+        indices = np.minimum(np.searchsorted(self.classes, crops), len(self.classes) - 1)
+        return indices[self.classes[indices] == crops]
+
+    @staticmethod
+    def _fractions(counts):
+        totals = counts.sum(axis=-1, keepdims=True)
+        return counts / np.maximum(totals, 1)
+
+    # ------------------------------
+    # 📥 Predict-path updates
+    # ------------------------------
+    def observe(self, row, crop):
+        """Counts one served row (FEATURE_COLUMNS order) and its predicted crop."""
+        bins = (np.asarray(row, dtype=float)[:, None] > self.edges).sum(axis=1)
+        class_index = self._class_indices([str(crop)])
+        with self._lock:
+            self._window[np.arange(len(self.features)), bins] += 1
+            if len(class_index):
+                self._window_classes[class_index[0]] += 1
+            self._total += 1
+
+    def observe_batch(self, matrix, crops):
+        """Counts an (n, features) block of served rows and their predicted crops."""
+        matrix = np.asarray(matrix, dtype=float).reshape(-1, len(self.features))
+        counts = self._bin_counts(matrix)
+        class_counts = np.bincount(self._class_indices(crops), minlength=len(self.classes))
+        with self._lock:
+            self._window += counts
+            self._window_classes += class_counts
+            self._total += len(matrix)
+
+    # ------------------------------
+    # 📐 Periodic evaluation
+    # ------------------------------
+    def evaluate(self, force=False):
+        """
+        Scores the current window against training and starts a new one.
+        Windows smaller than DRIFT_MIN_SAMPLES keep accumulating unless forced.
+        Returns the latest report (None before the first evaluation).
+        """
+        with self._lock:
+            samples = int(self._window[0].sum())
+            if samples == 0 or (samples < DRIFT_MIN_SAMPLES and not force):
+                return self.last_report
+            window, window_classes = self._window.copy(), self._window_classes.copy()
+            window_started = self._window_started
+            self._window[:] = 0
+            self._window_classes[:] = 0
+            self._window_started = time.time()
+
+        served = self._fractions(window)
+        features, alerts = {}, []
+        for i, feature in enumerate(self.features):
+            psi = _psi(self.training_hist[i], served[i])
+            ks = float(np.abs(np.cumsum(served[i]) - np.cumsum(self.training_hist[i])).max())
+            features[feature] = {"psi": round(psi, 4), "ks": round(ks, 4)}
+            FEATURE_PSI.set(psi, feature)
+            FEATURE_KS.set(ks, feature)
+            if psi >= DRIFT_PSI_ALERT or ks >= DRIFT_KS_ALERT:
+                alerts.append({"feature": feature, "severity": "alert", "psi": round(psi, 4), "ks": round(ks, 4)})
+            elif psi >= DRIFT_PSI_WARN:
+                alerts.append({"feature": feature, "severity": "warning", "psi": round(psi, 4), "ks": round(ks, 4)})
+
+        predicted = self._fractions(window_classes)
+        prediction_psi = _psi(self.training_classes, predicted)
+        PREDICTION_PSI.set(prediction_psi)
+        if prediction_psi >= DRIFT_PSI_ALERT:
+            alerts.append({"feature": "predicted_crop", "severity": "alert", "psi": round(prediction_psi, 4)})
+
+        for severity in ("warning", "alert"):
+            DRIFT_ALERTS.set(sum(1 for a in alerts if a["severity"] == severity), severity)
+
+        top = np.argsort(-window_classes)[:5]
+        self.last_report = {
+            "window_started": window_started,
+            "window_ended": time.time(),
+            "samples": samples,
+            "total_observed": self._total,
+            "features": features,
+            "prediction_psi": round(prediction_psi, 4),
+            "top_predictions": [{"crop": str(self.classes[i]), "share": round(float(predicted[i]), 4)}
+                                for i in top if window_classes[i]],
+            "alerts": alerts,
+        }
+        return self.last_report
+
+    def status(self):
+        with self._lock:
+            pending = int(self._window[0].sum())
+        return {"pending_samples": pending, "min_samples": DRIFT_MIN_SAMPLES,
+                "eval_seconds": DRIFT_EVAL_SECONDS, "last_report": self.last_report}
+
+
+try:
+    _training = pd.read_csv(TRAINING_DATA_PATH)
+    monitor = DriftMonitor(_training, _training['label'].unique())
+    del _training
+except Exception as e:
+    logger.error("Error building drift monitor: %s", e)
+    monitor = None
+
+_evaluator = None
+
+
+def observe(row, crop):
+    if monitor is not None:
+        monitor.observe(row, crop)
+
+
+def observe_batch(matrix, crops):
+    if monitor is not None:
+        monitor.observe_batch(matrix, crops)
+
+
+def start_evaluator(interval_seconds=DRIFT_EVAL_SECONDS):
+    """Runs monitor.evaluate() every `interval_seconds` on a daemon thread."""
+    global _evaluator
+    if _evaluator is not None or monitor is None or interval_seconds <= 0:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                monitor.evaluate()
+            except Exception:
+                logger.exception("Drift evaluation failed")
+
+    _evaluator = threading.Thread(target=loop, name="drift-evaluator", daemon=True)
+    _evaluator.start()
@@ -0,0 +1,203 @@
+"""
+Minimal-amendment soil optimizer.
+
+Answers "what is the cheapest fertilizer / pH change that makes crop X the
+recommendation?" by scoring candidate amendments in large vectorized
+batches: one coarse grid over (ΔN, ΔP, ΔK, ΔpH), then repeated local
+refinement around the cheapest winner until the time budget runs out.
+
+The coarse grid is scored in shuffled chunks sized from the measured
+scoring speed, and no chunk or refinement batch starts unless it is
+expected to finish before the deadline. Only the first chunk (which
+holds "no change") always runs, so a tiny budget still gets an answer
+in about one forest pass.
+"""
+import time
+
+import numpy as np
+
+from app.utils import predict_proba_batch, model, FEATURE_COLUMNS
+from app import validation
+
+# Upper limits of the soil parameters the model was trained on (see README)
+NUTRIENT_MAX = {'N': 140.0, 'P': 145.0, 'K': 205.0}
+PH_RANGE = (3.5, 10.0)
+AMENDABLE = ('N', 'P', 'K', 'ph')
+
+DEFAULT_TIME_BUDGET_MS = 500
+MAX_TIME_BUDGET_MS = 5000
+COARSE_STEPS = 8
+REFINE_STEPS = 6
+MAX_REFINEMENTS = 12
+MIN_STEP = 0.01
+# Coarse-grid chunk sizes: the first chunk measures scoring speed
+FIRST_CHUNK_ROWS = 128
+MAX_CHUNK_ROWS = 4096
+
+
+def _delta_bounds(current):
+    """(low, high) allowed change per amendable feature: nutrients can only be added."""
+    low = np.array([0.0, 0.0, 0.0, PH_RANGE[0] - current['ph']])
+    high = np.array([max(NUTRIENT_MAX[c] - current[c], 0.0) for c in ('N', 'P', 'K')]
+                    + [PH_RANGE[1] - current['ph']])
+    return low, np.maximum(high, low)
+
+
+def _grid(axes):
+    mesh = np.meshgrid(*axes, indexing='ij')
+    return np.stack([m.ravel() for m in mesh], axis=1)
+
+
+def _best(cost, probability, winners):
+    """Index of the cheapest winner, else of the most probable candidate (cheapest on ties)."""
+    if winners.any():
+        return np.flatnonzero(winners)[np.argmin(cost[winners])]
+    return np.lexsort((cost, -probability))[0]
+
+
+class _ScoringClock:
+    """Predicts how long a batch of n candidates takes from the batches scored so far."""
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.call_seconds = None   # fastest batch seen: the per-call floor
+        self.row_seconds = None    # per-row time of the latest batch
+
+    def observe(self, rows, seconds):
+        self.call_seconds = seconds if self.call_seconds is None else min(self.call_seconds, seconds)
+        self.row_seconds = seconds / rows
+
+    def predict(self, rows):
+        return max(self.call_seconds, rows * self.row_seconds)
+
+    def remaining(self):
+        return self.deadline - time.perf_counter()
+
+    def fits(self, rows):
+        return self.predict(rows) <= self.remaining()
+
+
+def _evaluate(current_row, deltas, costs, target_index):
+    """Scores amendments in one batch; returns (cost, target prob, is_winner) arrays."""
+    features = np.tile(current_row, (len(deltas), 1))
+    for i, feature in enumerate(AMENDABLE):
+        features[:, FEATURE_COLUMNS.index(feature)] += deltas[:, i]
+
+    probabilities = predict_proba_batch(features)
+    target_probability = probabilities[:, target_index]
+    winners = probabilities.argmax(axis=1) == target_index
+    return np.abs(deltas) @ costs, target_probability, winners
+
+
+def optimize_amendment(current, target_crop, costs=None, time_budget_ms=DEFAULT_TIME_BUDGET_MS):
+    """
+    🧪 Finds the cheapest soil amendment that makes `target_crop` the recommendation.
+
+    Args:
+        current: Dict with N, P, K, temperature, humidity, ph, rainfall
+        target_crop: Crop label the farmer wants recommended
+        costs: Optional dict of cost per unit change for N, P, K, ph (default 1 each)
+        time_budget_ms: Hard time budget for the search
+
+    Returns:
+        dict: Amendment, cost, resulting target probability and search stats
+    """
+    started = time.perf_counter()
+
+    if model is None:
+        return {"error": "Model or scaler not loaded properly."}
+
+    classes = [str(c) for c in model.classes_]
+    if target_crop not in classes:
+        return {"error": f"Unknown crop '{target_crop}'"}
+    target_index = classes.index(target_crop)
+
+    try:
+        current = {c: float(current[c]) for c in FEATURE_COLUMNS}
+        costs = costs or {}
+        cost_vector = np.array([float(costs.get(c, 1.0)) for c in AMENDABLE])
+        time_budget_ms = float(time_budget_ms)
+    except (KeyError, TypeError, ValueError):
+        return {"error": f"Inputs must provide numeric {', '.join(FEATURE_COLUMNS)}; costs and time_budget_ms must be numeric"}
+    current_row = np.array([current[c] for c in FEATURE_COLUMNS])
+    if not (np.isfinite(current_row).all() and np.isfinite(cost_vector).all() and np.isfinite(time_budget_ms)):
+        return {"error": "Inputs, costs and time_budget_ms must be finite numbers"}
+    if (cost_vector < 0).any():
+        return {"error": "Costs must be non-negative"}
+    rejected, issues = validation.check(current_row)
+    if rejected[0]:
+        return {"error": "Invalid input: " + "; ".join(issues[0])}
+
+    budget = min(max(time_budget_ms, 1.0), MAX_TIME_BUDGET_MS) / 1000.0
+    clock = _ScoringClock(started + budget)
+    low, high = _delta_bounds(current)
+
+    # 1️⃣ Coarse grid over the whole feasible range, "no change" first and
+    # the rest shuffled so a budget-truncated pass still covers the range
+    axes = [np.union1d(np.linspace(lo, hi, COARSE_STEPS), [0.0]) for lo, hi in zip(low, high)]
+    grid = _grid(axes)
+    no_change = np.flatnonzero(~grid.any(axis=1))
+    rest = np.random.default_rng(0).permutation(np.flatnonzero(grid.any(axis=1)))
+    grid = grid[np.concatenate([no_change, rest])]
+
+    parts, evaluated, chunk = [], 0, FIRST_CHUNK_ROWS
+    while evaluated < len(grid):
+        deltas = grid[evaluated:evaluated + chunk]
+        batch_started = time.perf_counter()
+        parts.append(_evaluate(current_row, deltas, cost_vector, target_index))
+        clock.observe(len(deltas), time.perf_counter() - batch_started)
+        evaluated += len(deltas)
+        chunk = int(min(MAX_CHUNK_ROWS, max(clock.remaining() / clock.row_seconds, FIRST_CHUNK_ROWS)))
+        if not clock.fits(min(chunk, len(grid) - evaluated)):
+            break
+    deltas = grid[:evaluated]
+    cost, probability, winners = (np.concatenate(columns) for columns in zip(*parts))
+    coarse_complete = evaluated == len(grid)
+
+    best = _best(cost, probability, winners)
+    best_delta, best_cost = deltas[best], cost[best]
+    best_probability, achieved = probability[best], bool(winners.any())
+    steps = np.array([(hi - lo) / (COARSE_STEPS - 1) for lo, hi in zip(low, high)])
+
+    # 2️⃣ Local refinement around the incumbent until time or resolution runs out
+    iterations = 0
+    while (iterations < MAX_REFINEMENTS and clock.fits(REFINE_STEPS ** len(AMENDABLE))
+           and (steps > MIN_STEP).any() and not (achieved and best_cost == 0)):
+        axes = [np.unique(np.clip(np.linspace(d - s, d + s, REFINE_STEPS), lo, hi))
+                for d, s, lo, hi in zip(best_delta, steps, low, high)]
+        deltas = _grid(axes)
+        batch_started = time.perf_counter()
+        cost, probability, winners = _evaluate(current_row, deltas, cost_vector, target_index)
+        clock.observe(len(deltas), time.perf_counter() - batch_started)
+        evaluated += len(deltas)
+        iterations += 1
+
+        candidate = _best(cost, probability, winners)
+        if winners.any():
+            if not achieved or cost[candidate] < best_cost:
+                best_delta, best_cost = deltas[candidate], cost[candidate]
+                best_probability, achieved = probability[candidate], True
+        elif not achieved and (probability[candidate] > best_probability
+                               or (probability[candidate] == best_probability and cost[candidate] < best_cost)):
+            best_delta, best_cost, best_probability = deltas[candidate], cost[candidate], probability[candidate]
+
+        steps = steps * 2 / (REFINE_STEPS - 1)
+
+    amendment = {c: round(float(d), 3) for c, d in zip(AMENDABLE, best_delta)}
+    amended = dict(current)
+    for feature, delta in amendment.items():
+        amended[feature] = round(current[feature] + delta, 3)
+
+    return {
+        "mode": "OPTIMIZE",
+        "target_crop": target_crop,
+        "achieved": achieved,
+        "amendment": amendment,
+        "amended_input": amended,
+        "cost": round(float(best_cost), 3),
+        "target_probability": round(float(best_probability), 3),
+        "evaluated_candidates": int(evaluated),
+        "coarse_grid_complete": coarse_complete,
+        "refinement_iterations": iterations,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
@@ -0,0 +1,189 @@
+"""
+Opt-in per-request profiling for the Flask app.
+
+A request is profiled when it carries the admin header
+(X-Profile-Token: <PROFILE_ADMIN_TOKEN>) or is picked by PROFILE_SAMPLE_RATE.
+Profiled requests get a stack-sampling profile of the handling thread plus
+span timings for every metrics.timed() stage (geolocation, openweather,
+nasa_power, scaling, predict). Results are kept in a bounded on-disk ring
+and can be exported in collapsed-stack format for flamegraph.pl/speedscope.
+"""
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from app.metrics import add_stage_listener
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+PROFILE_ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_RING_SIZE = int(os.environ.get("PROFILE_RING_SIZE", "50"))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000.0
+PROFILE_HEADER = "X-Profile-Token"
+
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+_ring_lock = threading.Lock()
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class RequestProfile:
+    def __init__(self, method, path, reason):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+        self._sampler = _StackSampler(threading.get_ident(), PROFILE_INTERVAL)
+        self._token = None
+
+    def add_span(self, stage, start, duration):
+        self.spans.append({
+            "stage": stage,
+            "offset_ms": round((start - self.start) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        })
+
+    def to_dict(self, status):
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "status": status,
+            "started_at": self.started_at,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "sample_interval_ms": PROFILE_INTERVAL * 1000,
+            "spans": self.spans,
+            "stacks": dict(self._sampler.stacks),
+        }
+
+
+def _record_span(stage, start, duration):
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.add_span(stage, start, duration)
+
+
+add_stage_listener(_record_span)
+
+
+def is_admin(headers):
+    """True when the request carries the configured admin token."""
+    return bool(PROFILE_ADMIN_TOKEN) and headers.get(PROFILE_HEADER) == PROFILE_ADMIN_TOKEN
+
+
+def start_profile(headers, method, path):
+    """
+    Starts profiling the current request if it is opted in.
+    Returns the RequestProfile, or None when the request is not profiled.
+    """
+    if is_admin(headers):
+        reason = "admin"
+    elif PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        reason = "sampled"
+    else:
+        return None
+
+    profile = RequestProfile(method, path, reason)
+    profile._token = _active_profile.set(profile)
+    profile._sampler.start()
+    return profile
+
+
+def finish_profile(profile, status):
+    """Stops sampling and writes the profile into the on-disk ring."""
+    profile._sampler.stop()
+    _active_profile.reset(profile._token)
+    _write_to_ring(profile.to_dict(status))
+    return profile.id
+
+
+def _write_to_ring(data):
+    with _ring_lock:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        # Millisecond timestamp prefix keeps the ring ordered by age
+        filename = f"{int(data['started_at'] * 1000):013d}-{data['id']}.json"
+        with open(os.path.join(PROFILE_DIR, filename), "w") as f:
+            json.dump(data, f)
+
+        entries = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(".json"))
+        for name in entries[:max(0, len(entries) - PROFILE_RING_SIZE)]:
+            os.remove(os.path.join(PROFILE_DIR, name))
+
+
+def _find_profile_file(profile_id):
+    if not os.path.isdir(PROFILE_DIR):
+        return None
+    suffix = f"-{profile_id}.json"
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(suffix):
+            return os.path.join(PROFILE_DIR, name)
+    return None
+
+
+def list_profiles():
+    """Summaries of the stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summaries.append({key: data[key] for key in
+                          ("id", "method", "path", "reason", "status", "started_at", "duration_ms")})
+    return summaries
+
+
+def load_profile(profile_id):
+    path = _find_profile_file(profile_id)
+    if path is None:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def to_collapsed(profile):
+    """Collapsed-stack text ("frame;frame;frame count" per line) for flamegraph tools."""
+    lines = [f"{stack} {count}" for stack, count in sorted(profile["stacks"].items())]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,271 @@
+"""
+Admission control for upstream-quota-bound requests.
+
+- Token buckets per upstream API keep us under their per-minute quotas.
+  Buckets live in each process, so with several server processes every
+  process gets 1/UPSTREAM_BUDGET_WORKERS of each quota (gunicorn.conf.py
+  sets it to the worker count); the sum stays within the quota.
+- Per-client token buckets return fast 429s with Retry-After. Clients are
+  keyed by peer address; X-Forwarded-For is only believed when the peer is
+  one of TRUSTED_PROXIES.
+- A global in-flight cap sheds excess live requests before they queue.
+"""
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.metrics import record_budget_exhausted
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate` tokens/second."""
+
+    def __init__(self, capacity, rate):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1, keep=0.0):
+        """
+        Takes `tokens` if at least `keep` tokens remain afterwards.
+        Returns (acquired, retry_after_seconds).
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens - tokens >= keep:
+                self._tokens -= tokens
+                return True, 0.0
+            if self.rate <= 0 or tokens + keep > self.capacity:
+                return False, float("inf")
+            return False, (tokens + keep - self._tokens) / self.rate
+
+    def refund(self, tokens=1):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def snapshot(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "available": round(self._tokens, 2),
+                "capacity": self.capacity,
+                "refill_per_minute": round(self.rate * 60, 2),
+            }
+
+
+def per_minute(limit, burst=None):
+    """Bucket allowing `limit` requests per minute with the given burst (defaults to limit)."""
+    return TokenBucket(burst if burst is not None else limit, limit / 60.0)
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+# ------------------------------
+# 🌐 Upstream budgets
+# ------------------------------
+# Processes sharing the API keys; each one enforces its share of the quotas
+UPSTREAM_BUDGET_WORKERS = max(_env_int("UPSTREAM_BUDGET_WORKERS", 1), 1)
+UPSTREAM_BUDGETS = {
+    "openweather": per_minute(_env_int("OPENWEATHER_PER_MINUTE", 60) / UPSTREAM_BUDGET_WORKERS),
+    "nasa_power": per_minute(_env_int("NASA_POWER_PER_MINUTE", 120) / UPSTREAM_BUDGET_WORKERS),
+    "geolocation": per_minute(_env_int("GEOLOCATION_PER_MINUTE", 40) / UPSTREAM_BUDGET_WORKERS),
+}
+
+
+# Share of every upstream bucket that background (bulk) work leaves to live requests
+BULK_BUDGET_RESERVE = float(os.environ.get("BULK_BUDGET_RESERVE", "0.25"))
+
+
+def try_acquire_upstream(upstreams, tokens=1, reserve=0.0):
+    """
+    Takes `tokens` from every named upstream budget, or none of them, leaving
+    at least `reserve` (a fraction of capacity) in each bucket.
+    Returns (acquired, retry_after_seconds).
+    """
+    acquired = []
+    for upstream in upstreams:
+        bucket = UPSTREAM_BUDGETS[upstream]
+        ok, retry_after = bucket.try_acquire(tokens, keep=bucket.capacity * reserve)
+        if not ok:
+            for name in acquired:
+                UPSTREAM_BUDGETS[name].refund(tokens)
+            return False, retry_after
+        acquired.append(upstream)
+    return True, 0.0
+
+
+def acquire_upstream(*upstreams):
+    """
+    Takes one token from every named upstream budget, or none of them.
+    Returns True when all were acquired.
+    """
+    return try_acquire_upstream(upstreams)[0]
+
+
+def wait_for_upstream(upstreams, max_wait, reserve=BULK_BUDGET_RESERVE):
+    """
+    Blocking acquire_upstream() for background work: sleeps until one token of
+    every named budget can be taken without dipping into the `reserve` kept for
+    live requests. Returns False if that takes longer than `max_wait` seconds.
+    """
+    deadline = time.monotonic() + max_wait
+    while True:
+        acquired, retry_after = try_acquire_upstream(upstreams, reserve=reserve)
+        if acquired:
+            return True
+        if retry_after > deadline - time.monotonic():
+            return False
+        time.sleep(retry_after)
+
+
+# ------------------------------
+# 👤 Per-client limits
+# ------------------------------
+class ClientLimiter:
+    """Per-client token buckets, keeping at most `max_clients` (least recently seen evicted)."""
+
+    def __init__(self, limit_per_minute, burst, max_clients=10000):
+        self.limit_per_minute = limit_per_minute
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, client):
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = per_minute(self.limit_per_minute, self.burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+        allowed, retry_after = bucket.try_acquire()
+        if not allowed:
+            record_budget_exhausted("client")
+        return allowed, retry_after
+
+    def snapshot(self):
+        return {
+            "tracked_clients": len(self._buckets),
+            "limit_per_minute": self.limit_per_minute,
+            "burst": self.burst,
+        }
+
+
+CLIENT_LIMITER = ClientLimiter(
+    _env_int("CLIENT_LIVE_PER_MINUTE", 30),
+    _env_int("CLIENT_LIVE_BURST", 10),
+)
+
+
+# ------------------------------
+# 🚦 Global in-flight cap for live requests
+# ------------------------------
+class InflightLimiter:
+    """Non-blocking cap on concurrently running requests."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_enter(self):
+        """Claims a slot without blocking; pair a successful call with leave()."""
+        with self._lock:
+            if self.in_flight >= self.limit:
+                record_budget_exhausted("live_in_flight")
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self):
+        return {"in_flight": self.in_flight, "max_in_flight": self.limit}
+
+
+# Sync workers are pinned per request, so keep this close to the thread count.
+# The async path (app/asgi.py) can hold far more requests and has its own cap.
+LIVE_INFLIGHT = InflightLimiter(_env_int("LIVE_MAX_INFLIGHT", 64))
+ASYNC_LIVE_INFLIGHT = InflightLimiter(_env_int("ASYNC_LIVE_MAX_INFLIGHT", 1024))
+
+
+def _parse_networks(spec):
+    """"10.0.0.1, 10.1.0.0/16" -> [ip_network, ...] (blank entries ignored)."""
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in spec.split(",") if item.strip()]
+
+
+# Reverse proxies whose X-Forwarded-For is believed (addresses or CIDRs)
+TRUSTED_PROXIES = _parse_networks(os.environ.get("TRUSTED_PROXIES", ""))
+# Longest Retry-After we ever send (also stands in for "never", e.g. a 0 rate)
+RETRY_AFTER_MAX_SECONDS = 3600
+
+
+def _is_trusted_proxy(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def client_id(headers, remote_addr):
+    """
+    The peer address, or, when the peer is a trusted proxy, the nearest
+    X-Forwarded-For hop that is not itself a trusted proxy. Hops added by
+    the client are never reached, so rotating the header does not help.
+    """
+    if not remote_addr:
+        return "unknown"
+    forwarded = headers.get("X-Forwarded-For", "")
+    if not forwarded or not _is_trusted_proxy(remote_addr):
+        return remote_addr
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else remote_addr
+
+
+def admit_live(client, inflight):
+    """
+    Admission for a live request: the client's rate, then the in-flight cap.
+    Returns None when admitted (the caller must inflight.leave() when done),
+    else (error, retry_after_seconds) for a 429.
+    """
+    allowed, retry_after = CLIENT_LIMITER.try_acquire(client)
+    if not allowed:
+        return "Rate limit exceeded", retry_after
+    if not inflight.try_enter():
+        return "Too many live requests in flight", 1
+    return None
+
+
+def retry_after_header(seconds):
+    if not math.isfinite(seconds):
+        return str(RETRY_AFTER_MAX_SECONDS)
+    return str(min(max(1, math.ceil(seconds)), RETRY_AFTER_MAX_SECONDS))
+
+
+def status():
+    return {
+        "upstreams": {name: bucket.snapshot() for name, bucket in UPSTREAM_BUDGETS.items()},
+        "upstream_budget_workers": UPSTREAM_BUDGET_WORKERS,
+        "clients": CLIENT_LIMITER.snapshot(),
+        "live": LIVE_INFLIGHT.snapshot(),
+        "async_live": ASYNC_LIVE_INFLIGHT.snapshot(),
+    }
@@ -1,56 +1,124 @@
+import hashlib
 import joblib
+import logging
+import math
 import sys
 import os
+import asyncio
+import contextvars
+import numpy as np
 import pandas as pd
 import requests
+import time
 
 # Add parent directory to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from api.weather_api import get_weather_and_rainfall
+from api.weather_api import (get_weather_with_fallback, get_weather_with_fallback_async, weather_cell,
+                             fetch_weather_cells_async, fetch_weather_cells_concurrently,
+                             reserve_weather_budget)
+from app.metrics import timed, record_upstream_error, record_load_time, record_budget_exhausted
+from app.ratelimit import acquire_upstream, BULK_BUDGET_RESERVE
+from app.explain import explain_scaled
+from app import monitor
+from app import validation
+from app import iot
+
+logger = logging.getLogger(__name__)
 
 # ------------------------------
 # 📍 Location Detection Function
 # ------------------------------
+IPAPI_URL = os.environ.get("IPAPI_URL", "https://ipapi.co/json/")
+IP_API_URL = os.environ.get("IP_API_URL", "http://ip-api.com/json/")
+LOCATION_TIMEOUT = 5
+DEFAULT_LOCATION = (30.9, 75.8, "Ludhiana", "India")
+
+
+def _parse_ipapi(data):
+    lat = data.get('latitude')
+    lon = data.get('longitude')
+    city = data.get('city', 'Unknown')
+    country = data.get('country_name', 'Unknown')
+
+    # If data is valid, return it
+    if lat and lon:
+        return lat, lon, city, country
+    else:
+        raise ValueError("Invalid location data received")
+
+
+def _parse_ip_api(data):
+    if data.get('status') == 'success':
+        lat = data.get('lat')
+        lon = data.get('lon')
+        city = data.get('city', 'Unknown')
+        country = data.get('country', 'Unknown')
+        return lat, lon, city, country
+    return None
+
+
+@timed("geolocation")
 def get_current_location():
     """
     Automatically detects current location using IP-based geolocation.
     Returns latitude, longitude, city, and country.
-    Falls back to default location if detection fails.
+    Falls back to default location if detection fails or the
+    geolocation budget is exhausted.
     """
+    if not acquire_upstream("geolocation"):
+        record_budget_exhausted("geolocation")
+        return DEFAULT_LOCATION
+
     try:
         # Try ipapi.co first
-        response = requests.get('https://ipapi.co/json/', timeout=5)
-        data = response.json()
-        
-        lat = data.get('latitude')
-        lon = data.get('longitude')
-        city = data.get('city', 'Unknown')
-        country = data.get('country_name', 'Unknown')
-        
-        # If data is valid, return it
-        if lat and lon:
-            return lat, lon, city, country
-        else:
-            raise ValueError("Invalid location data received")
+        response = requests.get(IPAPI_URL, timeout=LOCATION_TIMEOUT)
+        return _parse_ipapi(response.json())
     except:
+        record_upstream_error("ipapi")
         try:
             # Fallback to ip-api.com
-            response = requests.get('http://ip-api.com/json/', timeout=5)
-            data = response.json()
-            
-            if data.get('status') == 'success':
-                lat = data.get('lat')
-                lon = data.get('lon')
-                city = data.get('city', 'Unknown')
-                country = data.get('country', 'Unknown')
-                return lat, lon, city, country
+            response = requests.get(IP_API_URL, timeout=LOCATION_TIMEOUT)
+            location = _parse_ip_api(response.json())
+            if location:
+                return location
         except:
             pass
+        record_upstream_error("ip_api")
         
         # Silently fall back to default location
         # This is normal behavior when location APIs are rate-limited
-        return 30.9, 75.8, "Ludhiana", "India"
+        return DEFAULT_LOCATION
+
+
+async def get_current_location_async(session):
+    """
+    Async version of get_current_location() using a shared aiohttp ClientSession.
+    """
+    async def fetch(url):
+        async with session.get(url) as response:
+            return await response.json(content_type=None)
+
+    if not acquire_upstream("geolocation"):
+        record_budget_exhausted("geolocation")
+        return DEFAULT_LOCATION
+
+    with timed("geolocation"):
+        try:
+            data = await asyncio.wait_for(fetch(IPAPI_URL), LOCATION_TIMEOUT)
+            return _parse_ipapi(data)
+        except Exception:
+            record_upstream_error("ipapi")
+            try:
+                data = await asyncio.wait_for(fetch(IP_API_URL), LOCATION_TIMEOUT)
+                location = _parse_ip_api(data)
+                if location:
+                    return location
+            except Exception:
+                pass
+            record_upstream_error("ip_api")
+
+            return DEFAULT_LOCATION
 
 
 # ------------------------------
@@ -60,21 +128,38 @@ def get_current_location():
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 MODEL_PATH = os.path.join(BASE_DIR, "model", "crop_recommendation_model.pkl")
 SCALER_PATH = os.path.join(BASE_DIR, "model", "scaler.pkl")
+FEATURE_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+
+def _model_version():
+    """Short content hash of the model + scaler files (keys per-model caches)."""
+    digest = hashlib.sha256()
+    for path in (MODEL_PATH, SCALER_PATH):
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
 
 try:
+    _load_start = time.perf_counter()
     model = joblib.load(MODEL_PATH)
     scaler = joblib.load(SCALER_PATH)
-    print("✅ Model and Scaler loaded successfully.")
+    MODEL_VERSION = _model_version()
+    record_load_time("model", time.perf_counter() - _load_start)
+    logger.info("Model and scaler loaded", extra={"model_version": MODEL_VERSION})
 except Exception as e:
-    print(f"❌ Error loading model/scaler: {e}")
+    logger.error("Error loading model/scaler: %s", e)
     model = None
     scaler = None
+    MODEL_VERSION = None
 
 
 # ------------------------------
 # 🌾 LIVE MODE - Auto fetch weather data
 # ------------------------------
-def recommend_crop_live(N, P, K, ph, lat, lon, api_key, iot_sensor_data=None):
+def recommend_crop_live(N, P, K, ph, lat, lon, api_key, iot_sensor_data=None, top_k=None,
+                        explain=False):
     """
     🌐 LIVE MODE: Recommends crop using live weather data from APIs
     and soil data from IoT sensors (future) or manual input.
@@ -86,6 +171,8 @@ def recommend_crop_live(N, P, K, ph, lat, lon, api_key, iot_sensor_data=None):
         api_key: OpenWeather API key
         iot_sensor_data: (Optional) Dict with IoT sensor readings
                         {'N': val, 'P': val, 'K': val, 'ph': val}
+        top_k: (Optional) Also return the k most likely crops with probabilities
+        explain: (Optional) Also return per-feature contributions to the prediction
 
     Returns:
         dict: Recommended crop + weather conditions + data source info
@@ -94,45 +181,255 @@ def recommend_crop_live(N, P, K, ph, lat, lon, api_key, iot_sensor_data=None):
     if model is None or scaler is None:
         return {"error": "Model or scaler not loaded properly."}
 
+    N, P, K, ph, soil_data_source = _resolve_soil_data(N, P, K, ph, iot_sensor_data)
+
+    # 1️⃣ Get live weather + rainfall data from APIs
+    # (cached or climatology weather when the upstream budget is exhausted)
+    logger.debug("Fetching live weather data", extra={"lat": lat, "lon": lon})
+    temp, humidity, rainfall, weather_source = get_weather_with_fallback(lat, lon, api_key)
+
+    if temp is None or humidity is None:
+        return {"error": "Failed to fetch weather data. Check API key or internet connection."}
+
+    logger.info("Live weather fetched", extra={"temperature": temp, "humidity": humidity,
+                                               "rainfall": rainfall, "weather_source": weather_source})
+
+    # 2️⃣ Scale + predict
+    recommended_crop, extras, error = _predict_crop(N, P, K, temp, humidity, ph, rainfall,
+                                                    top_k, explain)
+    if error:
+        return {"error": error}
+
+    # 3️⃣ Return final results
+    return _live_result(recommended_crop, N, P, K, ph, temp, humidity, rainfall,
+                        soil_data_source, weather_source, extras)
+
+
+async def _run_in_executor(executor, func, *args):
+    """
+    loop.run_in_executor() that runs `func` in a copy of the caller's context,
+    so the request's log context (and its stage timings) follows it.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, context.run, func, *args)
+
+
+async def recommend_crop_live_async(N, P, K, ph, lat, lon, api_key, session, executor,
+                                    iot_sensor_data=None, top_k=None, explain=False):
+    """
+    ⚡ Async LIVE MODE: same result as recommend_crop_live(), but the weather
+    APIs are awaited on a shared aiohttp session and the CPU-bound
+    scale + predict step runs on the given (bounded) executor.
+    """
+    if model is None or scaler is None:
+        return {"error": "Model or scaler not loaded properly."}
+
+    N, P, K, ph, soil_data_source = _resolve_soil_data(N, P, K, ph, iot_sensor_data)
+
+    temp, humidity, rainfall, weather_source = await get_weather_with_fallback_async(
+        session, lat, lon, api_key
+    )
+
+    if temp is None or humidity is None:
+        return {"error": "Failed to fetch weather data. Check API key or internet connection."}
+
+    recommended_crop, extras, error = await _run_in_executor(
+        executor, _predict_crop, N, P, K, temp, humidity, ph, rainfall, top_k, explain
+    )
+    if error:
+        return {"error": error}
+
+    return _live_result(recommended_crop, N, P, K, ph, temp, humidity, rainfall,
+                        soil_data_source, weather_source, extras)
+
+
+def parse_live_request(data):
+    """
+    Parses a live-mode request body. Shared by the Flask and ASGI live routes
+    so they cannot drift apart.
+
+    Returns a dict of recommend_crop_live() keyword arguments (N, P, K, ph,
+    iot_sensor_data, top_k, explain) plus "location": (lat, lon, city,
+    country), or None when the location should be auto-detected.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+
+    # Latest IoT aggregate for the field, if any sensors report for it
+    field_id = data.get('field_id')
+    iot_sensor_data = (iot.latest_soil(field_id) if field_id is not None else None) or {}
+    try:
+        soil = {c: float(data.get(c, iot_sensor_data.get(c))) for c in ('N', 'P', 'K', 'ph')}
+    except (TypeError, ValueError):
+        raise ValueError("N, P, K and ph must be numbers (or come from the field's IoT sensors)")
+
+    location = None
+    if not data.get('useCurrentLocation', True):
+        try:
+            lat = float(data.get('latitude', 30.9))
+            lon = float(data.get('longitude', 75.8))
+        except (TypeError, ValueError):
+            raise ValueError("latitude and longitude must be numbers")
+        location = (lat, lon, data.get('city', 'Unknown'), data.get('country', 'Unknown'))
+
+    return {
+        **soil,
+        "iot_sensor_data": iot_sensor_data or None,
+        "top_k": parse_top_k(data.get('top_k')),
+        "explain": bool(data.get('explain', False)),
+        "location": location,
+    }
+
+
+def finish_live_result(result, location, latency_seconds):
+    """Adds the location to a successful live result and records it in the history store."""
+    from app import history  # history imports this module
+
+    lat, lon, city, country = location
+    result["recommended_crop"] = str(result["recommended_crop"])
+    result["location"] = {
+        "city": city,
+        "country": country,
+        "latitude": lat,
+        "longitude": lon
+    }
+    history.record(result, latency_seconds)
+    result["success"] = True
+    return result
+
+
+def _resolve_soil_data(N, P, K, ph, iot_sensor_data):
+    """Prefers IoT sensor readings over manually entered soil values."""
     # Use IoT sensor data if available, otherwise use manual soil data
     if iot_sensor_data:
-        print("📡 Using IoT sensor data for soil parameters...")
+        logger.debug("Using IoT sensor data for soil parameters")
         N = iot_sensor_data.get('N', N)
         P = iot_sensor_data.get('P', P)
         K = iot_sensor_data.get('K', K)
         ph = iot_sensor_data.get('ph', ph)
-        soil_data_source = "IoT Sensors"
-    else:
-        soil_data_source = "Manual Input"
+        return N, P, K, ph, "IoT Sensors"
+    return N, P, K, ph, "Manual Input"
 
-    # 1️⃣ Get live weather + rainfall data from APIs
-    print("⏳ Fetching live weather data from APIs...")
-    temp, humidity, rainfall = get_weather_and_rainfall(lat, lon, api_key)
-
-    if temp is None or humidity is None:
-        return {"error": "Failed to fetch weather data. Check API key or internet connection."}
 
-    print(f"✅ Weather data: Temp={temp}°C, Humidity={humidity}%, Rainfall={rainfall}mm")
+def _predict_crop(N, P, K, temperature, humidity, ph, rainfall, top_k=None, explain=False):
+    """
+    Scales one feature row and predicts the crop.
+    With top_k, class probabilities come from the same forest pass and the
+    k best crops are returned alongside; with explain, the per-feature
+    contributions to the predicted crop are added.
+    Invalid rows are rejected before scaling; out-of-distribution rows
+    are scored with "warnings" (or rejected, see app.validation).
+    Returns (recommended_crop, extras, error); extras holds the optional
+    "top_crops" / "explanation" / "warnings" entries, and on error the
+    first two are None.
+    """
+    rejected, issues = validation.check([[N, P, K, temperature, humidity, ph, rainfall]])
+    if rejected[0]:
+        return None, None, "Invalid input: " + "; ".join(issues[0])
 
-    # 2️⃣ Prepare input features for ML model
     # Order must match your training dataset columns: N, P, K, temperature, humidity, ph, rainfall
-    features = pd.DataFrame([[N, P, K, temp, humidity, ph, rainfall]], 
-                           columns=['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall'])
+    features = pd.DataFrame([[N, P, K, temperature, humidity, ph, rainfall]],
+                           columns=FEATURE_COLUMNS)
 
-    # 3️⃣ Scale input
     try:
-        scaled_features = scaler.transform(features)
+        with timed("scaling"):
+            scaled_features = scaler.transform(features)
     except Exception as e:
-        return {"error": f"Scaling failed: {e}"}
+        return None, None, f"Scaling failed: {e}"
 
-    # 4️⃣ Predict the crop
+    extras = {"warnings": issues[0]} if issues else {}
     try:
-        prediction = model.predict(scaled_features)
-        recommended_crop = prediction[0]
+        with timed("predict"):
+            if top_k:
+                # RandomForestClassifier.predict is the argmax of predict_proba
+                probabilities = model.predict_proba(scaled_features)
+                prediction = model.classes_[probabilities.argmax(axis=1)]
+                extras["top_crops"] = top_k_crops(probabilities, top_k)[0]
+            else:
+                prediction = model.predict(scaled_features)
+        if explain:
+            extras["explanation"] = explain_features(scaled_features, prediction)[0]
+        monitor.observe([N, P, K, temperature, humidity, ph, rainfall], prediction[0])
+        return prediction[0], extras, None
     except Exception as e:
-        return {"error": f"Model prediction failed: {e}"}
+        return None, None, f"Model prediction failed: {e}"
+
+
+def explain_features(scaled_features, crops=None):
+    """
+    Per-feature contributions (tree-path / Saabas) for already-scaled rows:
+    bias + Σ contributions equals the forest probability of the explained
+    crop. Explains `crops` when given, otherwise the most likely crop.
+    """
+    class_indices = None if crops is None else np.searchsorted(model.classes_, crops)
+    with timed("explain"):
+        return explain_scaled(model, MODEL_VERSION, scaled_features, FEATURE_COLUMNS, class_indices)
+
+
+def explain_batch(feature_matrix):
+    """
+    🔎 Explanations for an (n, 7) array of rows in FEATURE_COLUMNS order
+    (offline reports); one result per row with crop, probability, bias and
+    per-feature contributions.
+    Raises RuntimeError if the model is not loaded.
+    """
+    if model is None or scaler is None:
+        raise RuntimeError("Model or scaler not loaded properly.")
+
+    return explain_features(scale_features(feature_matrix))
+
+
+def top_k_indices(probabilities, k):
+    """
+    Indices and probabilities of the k most likely classes per row of an
+    (n, n_classes) array, in descending order, using partial selection
+    (argpartition) rather than a full sort.
+    """
+    k = max(1, min(int(k), probabilities.shape[1]))
+    top = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    top_probabilities = np.take_along_axis(probabilities, top, axis=1)
+    order = np.argsort(-top_probabilities, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_probabilities, order, axis=1)
+
+
+def parse_top_k(value, maximum=None):
+    """
+    Request top_k: None when absent, else an integer between 1 and `maximum`
+    (default: the number of crops). Raises ValueError with a client-facing
+    message, so routes can answer 400.
+    """
+    if value is None:
+        return None
+    if maximum is None:
+        maximum = len(model.classes_) if model is not None else 1
+    try:
+        top_k = int(value)
+        if isinstance(value, bool) or (isinstance(value, float) and value != top_k):
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("top_k must be an integer")
+    if not 1 <= top_k <= maximum:
+        raise ValueError(f"top_k must be between 1 and {maximum}")
+    return top_k
+
+
+def top_k_crops(probabilities, k):
+    """
+    The k most likely crops per row as [{crop, probability}, ...] lists.
+    """
+    top, top_probabilities = top_k_indices(probabilities, k)
 
-    # 5️⃣ Return final results
+    # Convert once to Python lists; per-element numpy access dominates otherwise
+    classes = [str(c) for c in model.classes_]
+    return [
+        [{"crop": classes[i], "probability": p} for i, p in zip(row, row_p)]
+        for row, row_p in zip(top.tolist(), np.round(top_probabilities, 4).tolist())
+    ]
+
+
+def _live_result(recommended_crop, N, P, K, ph, temp, humidity, rainfall,
+                 soil_data_source, weather_source, extras=None):
     result = {
         "recommended_crop": recommended_crop,
         "temperature": round(temp, 2),
@@ -140,7 +437,7 @@ def recommend_crop_live(N, P, K, ph, lat, lon, api_key, iot_sensor_data=None):
         "rainfall": round(rainfall, 2),
         "mode": "LIVE",
         "soil_data_source": soil_data_source,
-        "weather_data_source": "Live APIs (OpenWeather + NASA)",
+        "weather_data_source": weather_source,
         "input_data": {
             "N": N,
             "P": P,
@@ -148,14 +445,14 @@ def recommend_crop_live(N, P, K, ph, lat, lon, api_key, iot_sensor_data=None):
             "ph": ph
         }
     }
-
+    result.update(extras or {})
     return result
 
 
 # ------------------------------
 # 📝 MANUAL MODE - All data manual
 # ------------------------------
-def recommend_crop_manual(N, P, K, temperature, humidity, ph, rainfall):
+def recommend_crop_manual(N, P, K, temperature, humidity, ph, rainfall, top_k=None, explain=False):
     """
     ✍️ MANUAL MODE: Recommends crop using all manually entered data.
     User provides both soil data AND weather data manually.
@@ -166,6 +463,8 @@ def recommend_crop_manual(N, P, K, temperature, humidity, ph, rainfall):
         humidity: Humidity in %
         ph: Soil pH value
         rainfall: Rainfall in mm
+        top_k: (Optional) Also return the k most likely crops with probabilities
+        explain: (Optional) Also return per-feature contributions to the prediction
 
     Returns:
         dict: Recommended crop + input data info
@@ -174,26 +473,15 @@ def recommend_crop_manual(N, P, K, temperature, humidity, ph, rainfall):
     if model is None or scaler is None:
         return {"error": "Model or scaler not loaded properly."}
 
-    print("✍️  Using manual data for all parameters...")
+    logger.debug("Using manual data for all parameters")
 
-    # 1️⃣ Prepare input features for ML model
-    features = pd.DataFrame([[N, P, K, temperature, humidity, ph, rainfall]], 
-                           columns=['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall'])
-
-    # 2️⃣ Scale input
-    try:
-        scaled_features = scaler.transform(features)
-    except Exception as e:
-        return {"error": f"Scaling failed: {e}"}
+    # 1️⃣ Scale + predict
+    recommended_crop, extras, error = _predict_crop(N, P, K, temperature, humidity, ph, rainfall,
+                                                    top_k, explain)
+    if error:
+        return {"error": error}
 
-    # 3️⃣ Predict the crop
-    try:
-        prediction = model.predict(scaled_features)
-        recommended_crop = prediction[0]
-    except Exception as e:
-        return {"error": f"Model prediction failed: {e}"}
-
-    # 4️⃣ Return final results
+    # 2️⃣ Return final results
     result = {
         "recommended_crop": recommended_crop,
         "temperature": round(temperature, 2),
@@ -209,10 +497,385 @@ def recommend_crop_manual(N, P, K, temperature, humidity, ph, rainfall):
             "ph": ph
         }
     }
+    result.update(extras)
 
     return result
 
 
+# ------------------------------
+# 📦 BATCH MODE - Vectorized scoring
+# ------------------------------
+def scale_features(feature_matrix):
+    """
+    Scales an (n, 7) array of rows in FEATURE_COLUMNS order with one
+    scaler.transform call.
+    """
+    features = pd.DataFrame(np.asarray(feature_matrix, dtype=float), columns=FEATURE_COLUMNS)
+    with timed("scaling"):
+        return scaler.transform(features)
+
+
+def predict_crops(feature_matrix):
+    """
+    Predicts crops for an (n, 7) array of rows in FEATURE_COLUMNS order
+    with a single scale + predict pass.
+    Raises RuntimeError if the model is not loaded.
+    """
+    if model is None or scaler is None:
+        raise RuntimeError("Model or scaler not loaded properly.")
+
+    scaled_features = scale_features(feature_matrix)
+    with timed("predict"):
+        return model.predict(scaled_features)
+
+
+def predict_proba_batch(feature_matrix):
+    """
+    Class probabilities (n, n_classes) for an (n, 7) array of rows, columns
+    ordered as model.classes_, with a single scale + predict_proba pass.
+    Raises RuntimeError if the model is not loaded.
+    """
+    if model is None or scaler is None:
+        raise RuntimeError("Model or scaler not loaded properly.")
+
+    scaled_features = scale_features(feature_matrix)
+    with timed("predict"):
+        return model.predict_proba(scaled_features)
+
+
+BATCH_MAX_ROWS = 10000
+
+
+def recommend_crop_batch(inputs, top_k=None, explain=False):
+    """
+    📦 BATCH MODE: Recommends crops for many manual inputs in one
+    vectorized scale + predict (or predict_proba with top_k) pass.
+
+    Args:
+        inputs: List of dicts with N, P, K, temperature, humidity, ph, rainfall
+        top_k: (Optional) Also return the k most likely crops per row
+        explain: (Optional) Also return per-feature contributions per row
+
+    Returns:
+        dict: One result per input, in input order
+    """
+    if model is None or scaler is None:
+        return {"error": "Model or scaler not loaded properly."}
+
+    if not isinstance(inputs, list) or not inputs:
+        return {"error": "inputs must be a non-empty list"}
+    if len(inputs) > BATCH_MAX_ROWS:
+        return {"error": f"At most {BATCH_MAX_ROWS} inputs per batch"}
+
+    try:
+        features = np.array([[float(row[c]) for c in FEATURE_COLUMNS] for row in inputs])
+    except (KeyError, TypeError, ValueError):
+        return {"error": f"Every input must provide numeric {', '.join(FEATURE_COLUMNS)}"}
+
+    # Rejected rows never reach the scaler; the rest are scored together
+    rejected, issues = validation.check(features)
+    accepted = np.flatnonzero(~rejected)
+
+    crops, top_crops, explanations = [], None, None
+    if len(accepted):
+        scored = features[accepted]
+        try:
+            if top_k:
+                probabilities = predict_proba_batch(scored)
+                crops = model.classes_[probabilities.argmax(axis=1)]
+                top_crops = top_k_crops(probabilities, top_k)
+            else:
+                crops = predict_crops(scored)
+            explanations = explain_features(scale_features(scored), crops) if explain else None
+            monitor.observe_batch(scored, crops)
+        except Exception as e:
+            return {"error": f"Model prediction failed: {e}"}
+
+    results = [None] * len(features)
+    for i in np.flatnonzero(rejected).tolist():
+        results[i] = {"error": "Invalid input: " + "; ".join(issues[i])}
+    for position, (i, crop) in enumerate(zip(accepted.tolist(), crops)):
+        result = {"recommended_crop": str(crop)}
+        if top_crops is not None:
+            result["top_crops"] = top_crops[position]
+        if explanations is not None:
+            result["explanation"] = explanations[position]
+        if i in issues:
+            result["warnings"] = issues[i]
+        results[i] = result
+
+    return {"mode": "BATCH", "count": len(results), "rejected": int(rejected.sum()), "results": results}
+
+
+# ------------------------------
+# 📈 WHAT-IF SWEEP - Sensitivity grid
+# ------------------------------
+SWEEP_MAX_AXES = 2
+SWEEP_MAX_STEPS = 200
+
+
+def recommend_crop_sweep(base, axes):
+    """
+    📈 WHAT-IF SWEEP: Scores a full grid of inputs around a base vector.
+
+    Args:
+        base: Dict with all of N, P, K, temperature, humidity, ph, rainfall
+        axes: 1 or 2 dicts {feature, start, stop, steps} to vary
+
+    Returns:
+        dict: Grid axis values, the classes that appear, and label-index /
+              probability matrices shaped (steps_1[, steps_2])
+    """
+    if model is None or scaler is None:
+        return {"error": "Model or scaler not loaded properly."}
+
+    try:
+        base_row = np.array([float(base[c]) for c in FEATURE_COLUMNS])
+    except (KeyError, TypeError, ValueError):
+        return {"error": f"base must provide numeric {', '.join(FEATURE_COLUMNS)}"}
+    if not np.isfinite(base_row).all():
+        return {"error": "base values must be finite numbers"}
+
+    if not isinstance(axes, list) or not 1 <= len(axes) <= SWEEP_MAX_AXES:
+        return {"error": f"axes must list 1 to {SWEEP_MAX_AXES} features to vary"}
+
+    columns, grids = [], []
+    for axis in axes:
+        if not isinstance(axis, dict):
+            return {"error": "Each axis must be an object {feature, start, stop, steps}"}
+        feature = axis.get('feature')
+        if feature not in FEATURE_COLUMNS or FEATURE_COLUMNS.index(feature) in columns:
+            return {"error": f"Invalid or repeated sweep feature: {feature}"}
+        try:
+            steps = int(axis.get('steps', 50))
+            start, stop = float(axis['start']), float(axis['stop'])
+        except (KeyError, TypeError, ValueError):
+            return {"error": f"Axis {feature} needs numeric start, stop and steps"}
+        if not (np.isfinite(start) and np.isfinite(stop)):
+            return {"error": f"Axis {feature} start and stop must be finite numbers"}
+        if not 2 <= steps <= SWEEP_MAX_STEPS:
+            return {"error": f"steps must be between 2 and {SWEEP_MAX_STEPS}"}
+        columns.append(FEATURE_COLUMNS.index(feature))
+        grids.append(np.linspace(start, stop, steps))
+
+    # Build the whole grid as one (n, 7) array
+    mesh = np.meshgrid(*grids, indexing='ij')
+    shape = mesh[0].shape
+    features = np.tile(base_row, (mesh[0].size, 1))
+    for column, values in zip(columns, mesh):
+        features[:, column] = values.ravel()
+
+    # A grid reaching impossible values (or, in reject mode, leaving the
+    # training distribution) is refused as a whole; flagged points are counted
+    rejected, issues = validation.check(features)
+    if rejected.any():
+        return {"error": "Invalid input: " + "; ".join(issues[int(np.flatnonzero(rejected)[0])])}
+
+    try:
+        probabilities = predict_proba_batch(features)
+    except Exception as e:
+        return {"error": f"Model prediction failed: {e}"}
+
+    best = probabilities.argmax(axis=1)
+    best_probability = probabilities[np.arange(len(best)), best]
+
+    # Compact label table: only the classes that actually win somewhere
+    present, label_index = np.unique(best, return_inverse=True)
+
+    return {
+        "mode": "SWEEP",
+        "base": dict(zip(FEATURE_COLUMNS, base_row.tolist())),
+        "features": [FEATURE_COLUMNS[c] for c in columns],
+        "values": [np.round(g, 4).tolist() for g in grids],
+        "classes": [str(c) for c in model.classes_[present]],
+        "labels": label_index.reshape(shape).tolist(),
+        "probabilities": np.round(best_probability, 3).reshape(shape).tolist(),
+        "flagged_points": len(issues)
+    }
+
+
+# ------------------------------
+# 🗺️ COMPARE MODE - Many locations, one soil profile
+# ------------------------------
+COMPARE_MAX_LOCATIONS = 500
+COMPARE_WEATHER_CONCURRENCY = int(os.environ.get("COMPARE_WEATHER_CONCURRENCY", "128"))
+SOIL_COLUMNS = ('N', 'P', 'K', 'ph')
+
+
+def _compare_plan(locations, soil):
+    """
+    Validates the locations of a compare request.
+    Returns (entries, results) where entries are (index, cell, soil values,
+    soil source) for the usable locations and results holds one dict per
+    location (coordinates, or the error for unusable ones); or an error string.
+    """
+    if not isinstance(locations, list) or not locations:
+        return "locations must be a non-empty list"
+    if len(locations) > COMPARE_MAX_LOCATIONS:
+        return f"At most {COMPARE_MAX_LOCATIONS} locations per request"
+    soil = soil or {}
+    if not isinstance(soil, dict):
+        return "soil must be an object with N, P, K, ph"
+
+    entries, results = [], []
+    for index, location in enumerate(locations):
+        if not isinstance(location, dict):
+            results.append({"error": "Location must be an object with latitude and longitude"})
+            continue
+        result = {"latitude": location.get('latitude'), "longitude": location.get('longitude')}
+        results.append(result)
+        try:
+            lat, lon = float(location['latitude']), float(location['longitude'])
+        except (KeyError, TypeError, ValueError):
+            result["error"] = "latitude and longitude must be numeric"
+            continue
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            result["error"] = "Coordinates out of range"
+            continue
+        try:
+            # Per-location soil values override the shared profile
+            values = [float(location[c] if location.get(c) is not None else soil[c]) for c in SOIL_COLUMNS]
+        except (KeyError, TypeError, ValueError):
+            result["error"] = f"Missing or non-numeric soil values ({', '.join(SOIL_COLUMNS)})"
+            continue
+        source = "Manual Input" if any(location.get(c) is not None for c in SOIL_COLUMNS) else "Shared Profile"
+        entries.append((index, weather_cell(lat, lon), values, source))
+    return entries, results
+
+
+def _compare_score(entries, results, weather, top_k=None):
+    """Scores every location that has weather in one vectorized pass; fills `results` in place."""
+    rows, scored = [], []
+    for index, cell, (N, P, K, ph), soil_source in entries:
+        temp, humidity, rainfall, weather_source = weather[cell]
+        if temp is None or humidity is None:
+            results[index]["error"] = "Failed to fetch weather data for this location"
+            continue
+        rows.append([N, P, K, temp, humidity, ph, rainfall])
+        results[index].update({
+            "temperature": round(temp, 2),
+            "humidity": round(humidity, 2),
+            "rainfall": round(rainfall, 2),
+            "soil_data_source": soil_source,
+            "weather_data_source": weather_source,
+            "input_data": {"N": N, "P": P, "K": K, "ph": ph}
+        })
+        scored.append(index)
+
+    if rows:
+        features = np.asarray(rows, dtype=float)
+        rejected, issues = validation.check(features)
+        for position in np.flatnonzero(rejected).tolist():
+            results[scored[position]]["error"] = "Invalid input: " + "; ".join(issues[position])
+        for position, messages in issues.items():
+            if not rejected[position]:
+                results[scored[position]]["warnings"] = messages
+        features = features[~rejected]
+        scored = [index for index, dropped in zip(scored, rejected) if not dropped]
+
+    if scored:
+        if top_k:
+            probabilities = predict_proba_batch(features)
+            crops = model.classes_[probabilities.argmax(axis=1)]
+            for index, top_crops in zip(scored, top_k_crops(probabilities, top_k)):
+                results[index]["top_crops"] = top_crops
+        else:
+            crops = predict_crops(features)
+        monitor.observe_batch(features, crops)
+        for index, crop in zip(scored, crops):
+            results[index]["recommended_crop"] = str(crop)
+
+    return {
+        "mode": "COMPARE",
+        "count": len(results),
+        "failed": sum(1 for r in results if "error" in r),
+        "weather_cells": len(weather),
+        "results": results
+    }
+
+
+def _reserve_compare_weather(cells):
+    """
+    Takes the upstream budget for every uncached cell up front, leaving the
+    reserve kept for single live requests, so one large compare cannot drain
+    it. Returns None on success, else an error dict; "retry_after" (seconds)
+    is set when the same request can succeed once the budget refills.
+    """
+    acquired, retry_after, uncached = reserve_weather_budget(cells, BULK_BUDGET_RESERVE)
+    if acquired:
+        return None
+    record_budget_exhausted("compare")
+    if math.isinf(retry_after):
+        return {"error": f"{uncached} locations need live weather, more than the upstream budget "
+                         f"allows in one request; split them across requests"}
+    return {"error": f"Upstream weather budget exhausted for {uncached} locations",
+            "retry_after": retry_after}
+
+
+def recommend_crop_compare(locations, api_key, soil=None, top_k=None):
+    """
+    🗺️ COMPARE MODE: Recommends crops for many candidate locations.
+    Locations are deduplicated to weather cells, each cell's weather is
+    fetched once with bounded concurrency, and all locations are scored
+    in one vectorized pass.
+
+    Args:
+        locations: List of dicts { latitude, longitude, N?, P?, K?, ph? }
+        api_key: OpenWeather API key
+        soil: (Optional) Shared soil profile {N, P, K, ph} for locations
+              that do not carry their own
+        top_k: (Optional) Also return the k most likely crops per location
+
+    Returns:
+        dict: One result per location, in input order; unusable locations
+              carry an "error" instead of a recommendation. When the weather
+              budget is short the dict holds "error" and "retry_after".
+    """
+    if model is None or scaler is None:
+        return {"error": "Model or scaler not loaded properly."}
+
+    plan = _compare_plan(locations, soil)
+    if isinstance(plan, str):
+        return {"error": plan}
+    entries, results = plan
+
+    cells = [cell for _, cell, _, _ in entries]
+    rejection = _reserve_compare_weather(cells)
+    if rejection is not None:
+        return rejection
+    weather = fetch_weather_cells_concurrently(cells, api_key, COMPARE_WEATHER_CONCURRENCY, reserved=True)
+    try:
+        return _compare_score(entries, results, weather, top_k)
+    except Exception as e:
+        return {"error": f"Model prediction failed: {e}"}
+
+
+async def recommend_crop_compare_async(locations, api_key, session, executor, soil=None, top_k=None):
+    """
+    ⚡ Async COMPARE MODE: same result as recommend_crop_compare(), with the
+    weather awaited on a shared aiohttp session and scoring run on the
+    given (bounded) executor.
+    """
+    if model is None or scaler is None:
+        return {"error": "Model or scaler not loaded properly."}
+
+    plan = _compare_plan(locations, soil)
+    if isinstance(plan, str):
+        return {"error": plan}
+    entries, results = plan
+
+    cells = [cell for _, cell, _, _ in entries]
+    rejection = _reserve_compare_weather(cells)
+    if rejection is not None:
+        return rejection
+    weather = await fetch_weather_cells_async(session, cells, api_key, COMPARE_WEATHER_CONCURRENCY,
+                                              reserved=True)
+    try:
+        return await _run_in_executor(executor, _compare_score, entries, results, weather, top_k)
+    except Exception as e:
+        return {"error": f"Model prediction failed: {e}"}
+
+
 # ------------------------------
 # 🔄 Legacy function (backward compatibility)
 # ------------------------------
@@ -0,0 +1,180 @@
+"""
+Feature-range guardrails for model inputs.
+
+Rows are checked in one vectorized pass before they reach
+scaler.transform:
+
+* physically impossible or non-finite values (negative nutrients or
+  rainfall, humidity above 100 %, pH outside 0-14, NaN) are rejected;
+* values outside the training range of a feature, and rows that fall in
+  no crop's class-conditional envelope (per-crop min/max of every
+  feature), are out of distribution: flagged with warnings by default,
+  rejected when VALIDATION_MODE=reject.
+
+Training ranges and envelopes are built from data/Crop_recommendation.csv
+into model/feature_bounds.json next to the model:
+
+    python3 app/validation.py
+
+VALIDATION_MARGIN widens both by a fraction of each feature's training
+range (default 0.1), clamped to the physical limits, and is applied at
+load, so it can be tuned without a rebuild.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path (so the build step runs as a script)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.metrics import VALIDATION_ROWS
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TRAINING_DATA_PATH = os.path.join(BASE_DIR, "data", "Crop_recommendation.csv")
+BOUNDS_PATH = os.environ.get("FEATURE_BOUNDS_PATH", os.path.join(BASE_DIR, "model", "feature_bounds.json"))
+# Same order as app.utils.FEATURE_COLUMNS (utils imports this module)
+FEATURE_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+VALIDATION_MODE = os.environ.get("VALIDATION_MODE", "flag").lower()  # flag | reject | off
+VALIDATION_MARGIN = float(os.environ.get("VALIDATION_MARGIN", "0.1"))
+# Values no real soil/weather reading can take, whatever the training data says
+PHYSICAL_BOUNDS = {
+    'N': (0.0, np.inf),
+    'P': (0.0, np.inf),
+    'K': (0.0, np.inf),
+    'temperature': (-60.0, 60.0),
+    'humidity': (0.0, 100.0),
+    'ph': (0.0, 14.0),
+    'rainfall': (0.0, np.inf),
+}
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------
+# 🏗️ Build step
+# ------------------------------
+def build_bounds(training_path=TRAINING_DATA_PATH):
+    """Training ranges and per-crop envelopes of every feature, as a JSON-ready dict."""
+    with open(training_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    training = pd.read_csv(training_path)
+    grouped = training.groupby('label')[FEATURE_COLUMNS]
+    low, high = grouped.min(), grouped.max()
+    return {
+        "source": os.path.relpath(training_path, BASE_DIR),
+        "source_sha256": digest,
+        "rows": len(training),
+        "features": FEATURE_COLUMNS,
+        "range": {c: [float(training[c].min()), float(training[c].max())] for c in FEATURE_COLUMNS},
+        "classes": {str(crop): {c: [float(low.at[crop, c]), float(high.at[crop, c])] for c in FEATURE_COLUMNS}
+                    for crop in low.index},
+    }
+
+
+def write_bounds(path=BOUNDS_PATH, training_path=TRAINING_DATA_PATH):
+    spec = build_bounds(training_path)
+    with open(path, 'w') as f:
+        json.dump(spec, f, indent=1)
+    return spec
+
+
+# ------------------------------
+# 🛡️ Vectorized check
+# ------------------------------
+class FeatureBounds:
+    def __init__(self, spec, margin=VALIDATION_MARGIN):
+        if spec["features"] != FEATURE_COLUMNS:
+            raise ValueError(f"Feature bounds are for {spec['features']}, expected {FEATURE_COLUMNS}")
+        self.physical = np.array([PHYSICAL_BOUNDS[c] for c in FEATURE_COLUMNS]).T        # (2, features)
+        training = np.array([spec["range"][c] for c in FEATURE_COLUMNS]).T               # (2, features)
+        pad = (training[1] - training[0]) * margin
+        # The margin never reaches past what is physically possible (no N below 0)
+        low, high = self.physical
+        self.range = np.clip(training + np.array([-pad, pad]), low, high)
+        self.classes = sorted(spec["classes"])
+        envelopes = np.array([[spec["classes"][crop][c] for c in FEATURE_COLUMNS] for crop in self.classes])
+        self.class_low = np.clip(envelopes[:, :, 0] - pad, low, high)                    # (classes, features)
+        self.class_high = np.clip(envelopes[:, :, 1] + pad, low, high)
+        # Identifies the loaded bounds file, for caches of validated results
+        self.version = hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+    def check(self, matrix, mode=None):
+        """
+        Checks an (n, 7) matrix in FEATURE_COLUMNS order. Returns
+        (rejected, issues): a boolean mask of rows that must not be scored,
+        and {row: [message, ...]} for every rejected or flagged row.
+        """
+        mode = mode or VALIDATION_MODE
+        matrix = np.asarray(matrix, dtype=float).reshape(-1, len(FEATURE_COLUMNS))
+        if mode == "off":
+            return np.zeros(len(matrix), dtype=bool), {}
+
+        with np.errstate(invalid='ignore'):
+            impossible = ~np.isfinite(matrix) | (matrix < self.physical[0]) | (matrix > self.physical[1])
+            out_of_range = (matrix < self.range[0]) | (matrix > self.range[1])
+            inside = ((matrix[:, None, :] >= self.class_low) & (matrix[:, None, :] <= self.class_high)).all(axis=2)
+        no_envelope = ~inside.any(axis=1)
+        out_of_distribution = out_of_range.any(axis=1) | no_envelope
+
+        rejected = impossible.any(axis=1)
+        if mode == "reject":
+            rejected |= out_of_distribution
+        flagged = rejected | out_of_distribution
+
+        # Messages only for the (usually few) rows with a problem
+        issues = {}
+        for i in np.flatnonzero(flagged).tolist():
+            messages = [f"{c}={matrix[i, j]:g} is outside the physical limits "
+                        f"[{self.physical[0, j]:g}, {self.physical[1, j]:g}]"
+                        for j, c in enumerate(FEATURE_COLUMNS) if impossible[i, j]]
+            messages += [f"{c}={matrix[i, j]:g} is outside the training range "
+                         f"[{self.range[0, j]:g}, {self.range[1, j]:g}]"
+                         for j, c in enumerate(FEATURE_COLUMNS) if out_of_range[i, j] and not impossible[i, j]]
+            if no_envelope[i] and not impossible[i].any():
+                messages.append("inputs do not match the conditions of any crop in the training data")
+            issues[i] = messages
+
+        VALIDATION_ROWS.inc("rejected", amount=int(rejected.sum()))
+        VALIDATION_ROWS.inc("flagged", amount=int((flagged & ~rejected).sum()))
+        VALIDATION_ROWS.inc("accepted", amount=int((~flagged).sum()))
+        return rejected, issues
+
+
+def _load_bounds():
+    try:
+        with open(BOUNDS_PATH) as f:
+            return FeatureBounds(json.load(f))
+    except FileNotFoundError:
+        logger.warning("%s not found, deriving feature bounds from the training data", BOUNDS_PATH)
+        return FeatureBounds(build_bounds())
+
+
+try:
+    bounds = _load_bounds()
+except Exception as e:
+    logger.error("Error loading feature bounds: %s", e)
+    bounds = None
+
+
+def cache_key():
+    """Everything besides the inputs that decides a validation result: mode, margin and bounds version."""
+    return [VALIDATION_MODE, VALIDATION_MARGIN, bounds.version if bounds is not None else None]
+
+
+def check(matrix):
+    """bounds.check(), or accept everything when the bounds could not be loaded."""
+    if bounds is None:
+        return np.zeros(len(matrix), dtype=bool), {}
+    return bounds.check(matrix)
+
+
+if __name__ == "__main__":
+    spec = write_bounds()
+    print(f"✅ Wrote {BOUNDS_PATH}")
+    print(f"   {spec['rows']} rows, {len(spec['classes'])} crops, source sha256 {spec['source_sha256']}")
@@ -0,0 +1,55 @@
+"""
+Benchmark: added latency of per-feature explanations over a plain predict.
+
+Compares _predict_crop with and without explain for a single row (the
+request path) and reports explain_batch() throughput on 10k rows. The
+one-off explainer build (per model version) is reported separately.
+
+Run from backend/:
+    python3 benchmarks/bench_explain.py
+"""
+import sys
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+warnings.filterwarnings('ignore')
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils import _predict_crop, explain_batch, model, MODEL_VERSION, FEATURE_COLUMNS
+from app.explain import get_explainer
+
+
+def bench(fn, repeat):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+
+data = pd.read_csv(os.path.join(os.path.dirname(__file__), '..', 'data', 'Crop_recommendation.csv'))
+row = data[FEATURE_COLUMNS].iloc[0].tolist()
+batch = data[FEATURE_COLUMNS].sample(10000, replace=True, random_state=0).to_numpy()
+
+print("=" * 60)
+print("⏱️  EXPLAIN vs PLAIN PREDICT (median ms)")
+print("=" * 60)
+
+start = time.perf_counter()
+get_explainer(model, MODEL_VERSION)
+print(f"Explainer build (once per model version): {(time.perf_counter() - start) * 1000:.2f}")
+
+single_plain = bench(lambda: _predict_crop(*row), 50)
+single_explain = bench(lambda: _predict_crop(*row, explain=True), 50)
+print(f"Single row   predict: {single_plain:8.2f}   explain: {single_explain:8.2f}   "
+      f"(+{single_explain - single_plain:.2f} ms)")
+
+batch_explain = bench(lambda: explain_batch(batch), 3)
+print(f"10k batch    explain_batch: {batch_explain:8.2f}")
+print("=" * 60)
@@ -0,0 +1,95 @@
+"""
+Benchmark: server CPU per request for repeated deterministic requests.
+
+Replays the same manual recommendation and chatbot query through the
+Flask app (in-process test client) in three ways:
+
+    recompute   response cache disabled, every request runs the model/TF-IDF
+    cached      in-process response cache hit (POST or GET without a validator)
+    304         GET with a matching If-None-Match (no body at all)
+
+and reports process CPU time per request. Also shows the size and CPU
+cost of each encoding for a 1000-row batch response.
+
+Run from backend/:
+    python3 benchmarks/bench_http_cache.py [--requests 1000]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import pandas as pd
+
+warnings.filterwarnings('ignore')
+# Keep history writes and request logs out of the measurement
+os.environ.setdefault("HISTORY_ENABLED", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.main import app
+from app import httpcache
+from app.utils import FEATURE_COLUMNS
+
+MANUAL = {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+CHAT = {"query": "What is the best soil for rice?"}
+
+
+def cpu_per_request(send, requests):
+    send()  # warm-up
+    start = time.process_time()
+    for _ in range(requests):
+        response = send()
+        assert response.status_code in (200, 304), response.status_code
+    return (time.process_time() - start) / requests * 1000
+
+
+def bench_endpoint(client, name, path, payload, requests):
+    etag = client.get(path, query_string=payload).headers["ETag"]
+
+    httpcache.response_cache = httpcache.ResponseCache(0)
+    recompute = cpu_per_request(lambda: client.post(path, json=payload), requests)
+    httpcache.response_cache = httpcache.ResponseCache(httpcache.RESPONSE_CACHE_SIZE)
+    cached = cpu_per_request(lambda: client.post(path, json=payload), requests)
+    not_modified = cpu_per_request(
+        lambda: client.get(path, query_string=payload, headers={"If-None-Match": etag}), requests)
+
+    print(f"{name:<8} recompute: {recompute:6.3f}   cached: {cached:6.3f} ({recompute / cached:4.1f}x)"
+          f"   304: {not_modified:6.3f} ({recompute / not_modified:4.1f}x)")
+
+
+def bench_encodings(client, rows=1000, repeat=20):
+    data = pd.read_csv(os.path.join(os.path.dirname(__file__), '..', 'data', 'Crop_recommendation.csv'))
+    payload = {"inputs": data[FEATURE_COLUMNS].sample(rows, replace=True, random_state=0).to_dict(orient="records"),
+               "top_k": 3}
+    for encoding in ("identity", "gzip", "br"):
+        if encoding not in ("identity",) + httpcache.ENCODINGS:
+            print(f"{encoding:<8} (not available: pip install brotli)")
+            continue
+        headers = {"Accept-Encoding": encoding}
+        size = len(client.post('/api/recommend/batch', json=payload, headers=headers).data)
+        cpu = cpu_per_request(lambda: client.post('/api/recommend/batch', json=payload, headers=headers), repeat)
+        print(f"{encoding:<8} {size / 1024:8.1f} KiB   {cpu:7.2f} ms CPU/response")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP cache / compression CPU benchmark")
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    print("=" * 72)
+    print(f"⏱️  SERVER CPU PER REPEATED REQUEST (ms, {args.requests} requests)")
+    print("=" * 72)
+    bench_endpoint(client, "manual", '/api/recommend/manual', MANUAL, args.requests)
+    bench_endpoint(client, "chat", '/api/chat', CHAT, args.requests)
+    print("-" * 72)
+    print("🗜️  1000-ROW BATCH RESPONSE BY ENCODING")
+    print("-" * 72)
+    bench_encodings(client)
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
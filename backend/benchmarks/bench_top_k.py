@@ -0,0 +1,57 @@
+"""
+Benchmark: added latency of top-k crops over a plain predict.
+
+Compares model.predict against predict_proba + partial top-k selection
+for a single row (the request path) and for a 10k-row batch. The cost of
+shaping the batch result into JSON-ready dicts is reported separately.
+
+Run from backend/:
+    python3 benchmarks/bench_top_k.py
+"""
+import sys
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+warnings.filterwarnings('ignore')
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils import (_predict_crop, predict_crops, predict_proba_batch, top_k_indices,
+                       top_k_crops, FEATURE_COLUMNS)
+
+
+def bench(fn, repeat):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+
+data = pd.read_csv(os.path.join(os.path.dirname(__file__), '..', 'data', 'Crop_recommendation.csv'))
+row = data[FEATURE_COLUMNS].iloc[0].tolist()
+batch = data[FEATURE_COLUMNS].sample(10000, replace=True, random_state=0).to_numpy()
+
+print("=" * 60)
+print("⏱️  TOP-K vs PLAIN PREDICT (median ms)")
+print("=" * 60)
+
+single_plain = bench(lambda: _predict_crop(*row), 50)
+single_top3 = bench(lambda: _predict_crop(*row, top_k=3), 50)
+print(f"Single row   predict: {single_plain:8.2f}   top_k=3: {single_top3:8.2f}   "
+      f"(+{single_top3 - single_plain:.2f} ms)")
+
+batch_plain = bench(lambda: predict_crops(batch), 5)
+batch_top3 = bench(lambda: top_k_indices(predict_proba_batch(batch), 3), 5)
+print(f"10k batch    predict: {batch_plain:8.2f}   top_k=3: {batch_top3:8.2f}   "
+      f"(+{batch_top3 - batch_plain:.2f} ms)")
+
+probabilities = predict_proba_batch(batch)
+shaping = bench(lambda: top_k_crops(probabilities, 3), 5)
+print(f"10k batch    JSON-ready top_k=3 dicts: {shaping:.2f}")
+print("=" * 60)
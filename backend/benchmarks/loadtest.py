@@ -0,0 +1,392 @@
+"""
+Offline load test: starts the API (Flask dev server, gunicorn with
+gunicorn.conf.py, or the uvicorn ASGI app) against local upstream stubs,
+drives an open-loop mix of manual / live / chat requests at a target RPS
+and reports throughput, p50/p99 latency, error rates and CPU/RSS per
+server process.
+
+Run from backend/:
+    python3 benchmarks/loadtest.py --server gunicorn --workers 4 --rps 50 --duration 60 \\
+        --mix manual=60,live=30,chat=10 --latency openweather=150:0.4:0.01
+
+CPU/RSS are read from /proc, so process stats need Linux.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from upstream_stubs import parse_profiles, start_stubs, stub_environment, DEFAULT_PROFILE
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(BACKEND_DIR, 'data')
+FEATURE_COLUMNS = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+ENDPOINTS = {
+    "manual": "/api/recommend/manual",
+    "live": "/api/recommend/live",
+    "chat": "/api/chat",
+}
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# ------------------------------
+# 🚀 Server under test
+# ------------------------------
+def server_command(server, port, workers):
+    if server == "flask":
+        return [sys.executable, "-c",
+                "from app.main import app; "
+                f"app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)"]
+    if server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "app.main:app"]
+    if server == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "app.asgi:app", "--host", "127.0.0.1",
+                "--port", str(port), "--workers", str(workers), "--no-access-log"]
+    raise ValueError(f"Unknown server '{server}'")
+
+
+def server_environment(args, scratch):
+    env = dict(os.environ)
+    env.update(stub_environment(args.stub_port))
+    env.update({
+        # Keep the run's side effects out of the working tree
+        "HISTORY_DIR": os.path.join(scratch, "history"),
+        "FIELDS_DB": os.path.join(scratch, "fields.sqlite3"),
+        "PROFILE_DIR": os.path.join(scratch, "profiles"),
+        "WEATHER_CACHE_TTL": str(args.weather_cache_ttl),
+        # The load generator plays a local reverse proxy, labelling each
+        # simulated client with X-Forwarded-For
+        "TRUSTED_PROXIES": "127.0.0.1",
+        "PYTHONUNBUFFERED": "1",
+    })
+    if args.unlimited_upstreams:
+        for name in ("OPENWEATHER_PER_MINUTE", "NASA_POWER_PER_MINUTE", "GEOLOCATION_PER_MINUTE"):
+            env[name] = "1000000"
+    return env
+
+
+async def wait_until_ready(session, base_url, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} during startup")
+        try:
+            async with session.get(base_url + "/api/health") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("Server did not become ready in time")
+
+
+# ------------------------------
+# 📈 Process stats (/proc)
+# ------------------------------
+def _read_stat(pid):
+    """(ppid, cpu_seconds) of a process, or None if it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return int(fields[1]), (int(fields[11]) + int(fields[12])) / CLK_TCK
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _read_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+def process_tree(root):
+    """PIDs of `root` and all its descendants."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            stat = _read_stat(int(entry))
+            if stat is not None:
+                children.setdefault(stat[0], []).append(int(entry))
+    pids, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of the server's process tree once per interval."""
+
+    def __init__(self, root, interval=1.0):
+        self.root = root
+        self.interval = interval
+        self.first_cpu = {}
+        self.last_cpu = {}
+        self.peak_rss = {}
+        self.started = self.stopped = None
+
+    def sample(self):
+        for pid in process_tree(self.root):
+            stat = _read_stat(pid)
+            if stat is None:
+                continue
+            self.first_cpu.setdefault(pid, stat[1])
+            self.last_cpu[pid] = stat[1]
+            self.peak_rss[pid] = max(self.peak_rss.get(pid, 0.0), _read_rss_mb(pid))
+
+    async def run(self, stop):
+        self.started = time.monotonic()
+        while not stop.is_set():
+            self.sample()
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+        self.sample()
+        self.stopped = time.monotonic()
+
+    def report(self):
+        wall = max((self.stopped or time.monotonic()) - (self.started or time.monotonic()), 1e-9)
+        return [{
+            "pid": pid,
+            "role": "main" if pid == self.root else "worker",
+            "cpu_percent": round((self.last_cpu[pid] - self.first_cpu[pid]) / wall * 100, 1),
+            "peak_rss_mb": round(self.peak_rss[pid], 1),
+        } for pid in sorted(self.last_cpu)]
+
+
+# ------------------------------
+# 🎯 Load generation
+# ------------------------------
+def parse_mix(spec):
+    """'manual=60,live=30,chat=10' -> ([names], [weights]); raises ValueError on bad specs."""
+    names, weights = [], []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' (expected one of {', '.join(ENDPOINTS)})")
+        names.append(name)
+        weights.append(float(weight or 1))
+    return names, weights
+
+
+class Payloads:
+    """Realistic request bodies sampled from the bundled datasets."""
+
+    def __init__(self, geolocate_ratio, seed):
+        self.random = random.Random(seed)
+        self.rows = pd.read_csv(os.path.join(DATA_DIR, 'Crop_recommendation.csv'))[FEATURE_COLUMNS] \
+            .to_dict(orient='records')
+        self.questions = pd.read_csv(os.path.join(DATA_DIR, 'chatbot_data.csv'))['question'].tolist()
+        self.geolocate_ratio = geolocate_ratio
+
+    def manual(self):
+        return dict(self.random.choice(self.rows))
+
+    def live(self):
+        row = self.random.choice(self.rows)
+        body = {c: row[c] for c in ('N', 'P', 'K', 'ph')}
+        if self.random.random() < self.geolocate_ratio:
+            body["useCurrentLocation"] = True
+        else:
+            body.update(useCurrentLocation=False,
+                        latitude=round(self.random.uniform(8, 35), 3),
+                        longitude=round(self.random.uniform(68, 97), 3))
+        return body
+
+    def chat(self):
+        return {"query": self.random.choice(self.questions)}
+
+
+async def fire(session, base_url, name, body, client, results, inflight, max_inflight):
+    if inflight[0] >= max_inflight:
+        results.append((name, 0.0, "client_overload"))
+        return
+    inflight[0] += 1
+    start = time.perf_counter()
+    try:
+        async with session.post(base_url + ENDPOINTS[name], json=body,
+                                headers={"X-Forwarded-For": client}) as response:
+            await response.read()
+            outcome = None if response.status < 400 else f"http_{response.status}"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+    except aiohttp.ClientError as e:
+        outcome = type(e).__name__
+    finally:
+        inflight[0] -= 1
+    results.append((name, time.perf_counter() - start, outcome))
+
+
+async def drive(session, base_url, args, payloads, record):
+    """Open-loop arrivals at args.rps for `duration` seconds; returns (results, elapsed)."""
+    names, weights = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    results, tasks, inflight = [], [], [0]
+    duration = args.duration if record else args.warmup
+    total = int(args.rps * duration)
+    start = time.monotonic()
+    next_at = start
+
+    for _ in range(total):
+        # Poisson arrivals by default, fixed spacing with --uniform
+        next_at += 1.0 / args.rps if args.uniform else rng.expovariate(args.rps)
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        name = rng.choices(names, weights)[0]
+        client_index = rng.randrange(args.clients)
+        client = f"10.{client_index >> 16 & 255}.{client_index >> 8 & 255}.{client_index & 255}"
+        tasks.append(asyncio.create_task(fire(session, base_url, name, getattr(payloads, name)(),
+                                              client, results, inflight, args.max_inflight)))
+    if tasks:
+        await asyncio.gather(*tasks)
+    return results, time.monotonic() - start
+
+
+def summarize(results, elapsed):
+    def stats(rows):
+        ok = [latency for _, latency, outcome in rows if outcome is None]
+        errors = {}
+        for _, _, outcome in rows:
+            if outcome is not None:
+                errors[outcome] = errors.get(outcome, 0) + 1
+        return {
+            "requests": len(rows),
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(float(np.percentile(ok, 50)) * 1000, 1) if ok else None,
+            "p99_ms": round(float(np.percentile(ok, 99)) * 1000, 1) if ok else None,
+            "error_rate": round(1 - len(ok) / len(rows), 4) if rows else 0.0,
+            "errors": errors,
+        }
+
+    report = {"elapsed_seconds": round(elapsed, 2), "overall": stats(results), "endpoints": {}}
+    for name in ENDPOINTS:
+        rows = [r for r in results if r[0] == name]
+        if rows:
+            report["endpoints"][name] = stats(rows)
+    return report
+
+
+def print_report(report, args):
+    print("\n" + "=" * 72)
+    print(f"📊 LOAD TEST — {args.server} (workers={args.workers}), target {args.rps} rps "
+          f"for {args.duration}s, mix {args.mix}")
+    print("=" * 72)
+    print(f"{'endpoint':<10}{'requests':>10}{'ok rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>10}")
+    for name, s in [("overall", report["overall"])] + list(report["endpoints"].items()):
+        print(f"{name:<10}{s['requests']:>10}{s['throughput_rps']:>10}{str(s['p50_ms']):>10}"
+              f"{str(s['p99_ms']):>10}{s['error_rate'] * 100:>9.2f}%")
+        if s["errors"]:
+            print(f"{'':<10}  {s['errors']}")
+    print("-" * 72)
+    print(f"{'pid':<10}{'role':<10}{'cpu %':>10}{'peak rss MB':>14}")
+    for p in report["processes"]:
+        print(f"{p['pid']:<10}{p['role']:<10}{p['cpu_percent']:>10}{p['peak_rss_mb']:>14}")
+    print("-" * 72)
+    print("Upstream stub calls:", report["upstream_calls"])
+    print("=" * 72)
+
+
+async def run(args):
+    profiles = parse_profiles(args.latency, (args.latency_ms, args.latency_sigma, args.error_rate))
+    runner, stub_app = await start_stubs(profiles, args.stub_port)
+    scratch = tempfile.mkdtemp(prefix="crop-loadtest-")
+    base_url = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen(server_command(args.server, args.port, args.workers), cwd=BACKEND_DIR,
+                               env=server_environment(args, scratch),
+                               stdout=subprocess.DEVNULL if args.quiet else None,
+                               stderr=subprocess.DEVNULL if args.quiet else None)
+    connector = aiohttp.TCPConnector(limit=args.max_inflight)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await wait_until_ready(session, base_url, process)
+            payloads = Payloads(args.geolocate_ratio, args.seed)
+            if args.warmup > 0:
+                print(f"🔥 Warm-up for {args.warmup}s...")
+                await drive(session, base_url, args, payloads, record=False)
+
+            for counts in stub_app["counts"].values():
+                counts.update(requests=0, errors=0)
+            print(f"🚦 Driving {args.rps} rps for {args.duration}s...")
+            sampler = ProcessSampler(process.pid)
+            stop = asyncio.Event()
+            sampling = asyncio.create_task(sampler.run(stop))
+            results, elapsed = await drive(session, base_url, args, payloads, record=True)
+            stop.set()
+            await sampling
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        await runner.cleanup()
+
+    report = summarize(results, elapsed)
+    report["processes"] = sampler.report()
+    report["upstream_calls"] = {name: dict(c) for name, c in stub_app["counts"].items()}
+    report["config"] = {k: v for k, v in vars(args).items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the Crop Recommendation API")
+    parser.add_argument("--server", choices=("flask", "gunicorn", "uvicorn"), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn/uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=5051)
+    parser.add_argument("--stub-port", type=int, default=9900)
+    parser.add_argument("--rps", type=float, default=20.0, help="Target arrival rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured warm-up seconds")
+    parser.add_argument("--uniform", action="store_true", help="Fixed spacing instead of Poisson arrivals")
+    parser.add_argument("--mix", default="manual=60,live=30,chat=10")
+    parser.add_argument("--clients", type=int, default=1000, help="Distinct simulated client addresses")
+    parser.add_argument("--geolocate-ratio", type=float, default=0.2,
+                        help="Share of live requests that use IP geolocation")
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_PROFILE[0], help="Default median upstream latency")
+    parser.add_argument("--latency-sigma", type=float, default=DEFAULT_PROFILE[1], help="Default log-normal sigma")
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_PROFILE[2], help="Default upstream error rate")
+    parser.add_argument("--latency", action="append", metavar="UPSTREAM=MS:SIGMA:ERROR_RATE",
+                        help="Per-upstream override (openweather, nasa_power, ipapi, ip_api); repeatable")
+    parser.add_argument("--weather-cache-ttl", type=int, default=600,
+                        help="WEATHER_CACHE_TTL for the server (0 sends every live request upstream)")
+    parser.add_argument("--unlimited-upstreams", action="store_true",
+                        help="Lift the upstream budgets so every miss reaches the stubs")
+    parser.add_argument("--max-inflight", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request client timeout")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--quiet", action="store_true", help="Hide server output")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
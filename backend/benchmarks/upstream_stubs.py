@@ -0,0 +1,132 @@
+"""
+Local stand-ins for the upstream APIs (OpenWeather, NASA POWER, ipapi.co,
+ip-api.com) so load tests run fully offline.
+
+Each upstream answers in its real JSON shape after a log-normally
+distributed delay and fails with the configured probability. Point the
+app at them with the *_URL environment variables returned by
+stub_environment().
+
+Run standalone from backend/:
+    python3 benchmarks/upstream_stubs.py --port 9900 --latency openweather=150:0.4:0.01
+"""
+import argparse
+import asyncio
+import datetime
+import random
+
+from aiohttp import web
+
+UPSTREAMS = ("openweather", "nasa_power", "ipapi", "ip_api")
+ROUTES = {
+    "openweather": "/openweather",
+    "nasa_power": "/nasa-power",
+    "ipapi": "/ipapi",
+    "ip_api": "/ip-api",
+}
+# Median latency (ms), log-normal sigma, error rate
+DEFAULT_PROFILE = (200.0, 0.5, 0.0)
+
+
+def parse_profiles(specs, default=DEFAULT_PROFILE):
+    """
+    Parses ["openweather=150:0.4:0.01", ...] into {upstream: (median_ms, sigma, error_rate)}.
+    Missing fields fall back to `default`; raises ValueError on bad specs.
+    """
+    profiles = {name: default for name in UPSTREAMS}
+    for spec in specs or []:
+        name, _, values = spec.partition("=")
+        if name not in UPSTREAMS:
+            raise ValueError(f"Unknown upstream '{name}' (expected one of {', '.join(UPSTREAMS)})")
+        fields = values.split(":")
+        profiles[name] = tuple(float(v) if v else d for v, d in zip(fields + [""] * 3, default))
+    return profiles
+
+
+def stub_environment(port, host="127.0.0.1"):
+    """Environment variables that point the app at stubs listening on host:port."""
+    base = f"http://{host}:{port}"
+    return {
+        "OPENWEATHER_URL": base + ROUTES["openweather"],
+        "NASA_POWER_URL": base + ROUTES["nasa_power"],
+        "IPAPI_URL": base + ROUTES["ipapi"],
+        "IP_API_URL": base + ROUTES["ip_api"],
+    }
+
+
+def _openweather(_):
+    return {"cod": 200, "main": {"temp": round(random.uniform(12, 38), 2),
+                                 "humidity": round(random.uniform(30, 95), 1)}}
+
+
+def _nasa_power(_):
+    end = datetime.date.today() - datetime.timedelta(days=5)
+    days = {(end - datetime.timedelta(days=i)).strftime("%Y%m%d"): round(random.uniform(0, 12), 2)
+            for i in range(30)}
+    return {"properties": {"parameter": {"PRECTOTCORR": days}}}
+
+
+def _ipapi(_):
+    return {"latitude": round(random.uniform(8, 35), 4), "longitude": round(random.uniform(68, 97), 4),
+            "city": "Stubville", "country_name": "India"}
+
+
+def _ip_api(_):
+    return {"status": "success", "lat": round(random.uniform(8, 35), 4),
+            "lon": round(random.uniform(68, 97), 4), "city": "Stubville", "country": "India"}
+
+
+BODIES = {"openweather": _openweather, "nasa_power": _nasa_power, "ipapi": _ipapi, "ip_api": _ip_api}
+
+
+def build_app(profiles):
+    """aiohttp application serving every upstream with its latency/error profile."""
+    counts = {name: {"requests": 0, "errors": 0} for name in UPSTREAMS}
+
+    def handler(name):
+        median_ms, sigma, error_rate = profiles[name]
+
+        async def handle(request):
+            counts[name]["requests"] += 1
+            delay = random.lognormvariate(0, sigma) * median_ms / 1000.0 if median_ms > 0 else 0
+            await asyncio.sleep(delay)
+            if random.random() < error_rate:
+                counts[name]["errors"] += 1
+                return web.json_response({"cod": 500, "message": "stub upstream error"}, status=500)
+            return web.json_response(BODIES[name](request))
+
+        return handle
+
+    app = web.Application()
+    for name, route in ROUTES.items():
+        app.router.add_get(route, handler(name))
+    app["counts"] = counts
+    return app
+
+
+async def start_stubs(profiles, port, host="127.0.0.1"):
+    """Starts the stubs on the running loop; returns (runner, app) — call runner.cleanup() to stop."""
+    app = build_app(profiles)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline upstream API stubs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9900)
+    parser.add_argument("--latency", action="append", metavar="UPSTREAM=MS:SIGMA:ERROR_RATE",
+                        help="Per-upstream latency profile (repeatable)")
+    args = parser.parse_args()
+
+    profiles = parse_profiles(args.latency)
+    print("🧪 Upstream stubs on", f"http://{args.host}:{args.port}")
+    for key, value in stub_environment(args.port, args.host).items():
+        print(f"   export {key}={value}")
+    web.run_app(build_app(profiles), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
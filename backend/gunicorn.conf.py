@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration for the Flask API.
+
+Run from backend/:
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Every setting can be overridden through the environment (GUNICORN_*).
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# Threads let a worker overlap the live-mode upstream calls
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+# The app starts background threads at import (field scheduler, drift
+# evaluator, history writer), which do not survive a fork, so every worker
+# imports the app itself instead of inheriting a preloaded copy.
+preload_app = False
+
+
+
+def on_starting(server):
+    """
+    Upstream API budgets are per process: split each quota across the final
+    worker count (after any --workers override). Workers import the app after
+    the fork and inherit this environment.
+    """
+    os.environ.setdefault("UPSTREAM_BUDGET_WORKERS", str(server.cfg.workers))
+
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG")  # unset = no access log
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
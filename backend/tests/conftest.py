@@ -0,0 +1,41 @@
+"""
+Shared fixtures for the API tests. Run from backend/:
+
+    python -m pytest -q tests
+
+Settings are read from the environment at import time, so they are fixed
+here before app.main is imported: no history files, no drift thread, and
+a throwaway field registry.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+_scratch = tempfile.mkdtemp(prefix="crop-tests-")
+os.environ.update({
+    "HISTORY_ENABLED": "0",
+    "HISTORY_DIR": os.path.join(_scratch, "history"),
+    "FIELDS_DB": os.path.join(_scratch, "fields.sqlite3"),
+    "PROFILE_DIR": os.path.join(_scratch, "profiles"),
+    "FIELD_RERUN_INTERVAL": "0",
+    "DRIFT_EVAL_SECONDS": "0",
+    "LOG_LEVEL": "WARNING",
+})
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.main import app  # noqa: E402
+
+MANUAL_INPUT = {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.fixture
+def manual_input():
+    return dict(MANUAL_INPUT)
@@ -0,0 +1,61 @@
+"""Malformed input gets a 400 with an error message, never a 500."""
+import pytest
+
+
+def _assert_bad_request(response):
+    assert response.status_code == 400
+    assert response.json["success"] is False
+    assert response.json["error"]
+
+
+@pytest.mark.parametrize("top_k", ["abc", 0, -1, 2.5, True, 23])
+def test_manual_rejects_bad_top_k(client, manual_input, top_k):
+    _assert_bad_request(client.post("/api/recommend/manual", json=dict(manual_input, top_k=top_k)))
+
+
+def test_manual_accepts_top_k(client, manual_input):
+    response = client.post("/api/recommend/manual", json=dict(manual_input, top_k="3"))
+    assert response.status_code == 200
+    assert len(response.json["top_crops"]) == 3
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/recommend/batch", {"inputs": [{}], "top_k": 0}),
+    ("/api/recommend/compare", {"locations": [{"latitude": 1, "longitude": 2}], "top_k": "x"}),
+    ("/api/recommend/live", {"N": 90, "P": 42, "K": 43, "ph": 6.5, "top_k": -1}),
+    ("/api/chat/batch", {"queries": ["rice"], "top_k": 11}),
+])
+def test_routes_reject_bad_top_k(client, path, body):
+    _assert_bad_request(client.post(path, json=body))
+
+
+@pytest.mark.parametrize("body", [
+    [1, 2],
+    {"N": "lots", "P": 42, "K": 43, "ph": 6.5},
+    {"N": 90, "P": 42, "K": 43, "ph": 6.5, "useCurrentLocation": False, "latitude": "north"},
+])
+def test_live_rejects_bad_body(client, body):
+    _assert_bad_request(client.post("/api/recommend/live", json=body))
+
+
+@pytest.mark.parametrize("axes", [["N"], [5], [], None])
+def test_sweep_rejects_bad_axes(client, manual_input, axes):
+    _assert_bad_request(client.post("/api/recommend/sweep", json={"base": manual_input, "axes": axes}))
+
+
+@pytest.mark.parametrize("costs", [[1, 2], 5, "cheap", {"N": "x"}, {"N": -1}])
+def test_optimize_rejects_bad_costs(client, manual_input, costs):
+    body = dict(manual_input, target_crop="rice", costs=costs)
+    _assert_bad_request(client.post("/api/recommend/optimize", json=body))
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/chat", [1]),
+    ("/api/chat", {"query": 5}),
+    ("/api/chat", {"query": "   "}),
+    ("/api/chat/batch", [1]),
+    ("/api/chat/batch", "rice"),
+    ("/api/chat/batch", {"queries": []}),
+])
+def test_chat_rejects_bad_body(client, path, body):
+    _assert_bad_request(client.post(path, json=body))
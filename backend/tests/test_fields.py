@@ -0,0 +1,28 @@
+import threading
+import time
+
+from app import fields
+
+
+def test_concurrent_run_gets_409(client, monkeypatch):
+    release = threading.Event()
+
+    def slow_weather(cells, *args, **kwargs):
+        release.wait(10)
+        return {}
+
+    monkeypatch.setattr(fields, "fetch_weather_cells", slow_weather)
+
+    assert client.post("/api/fields/runs").status_code == 202
+    try:
+        response = client.post("/api/fields/runs")
+        assert response.status_code == 409
+        assert response.json["success"] is False
+    finally:
+        release.set()
+
+    # The first run still finishes and frees the claim
+    deadline = time.time() + 10
+    while fields.list_runs()[0]["status"] == "running" and time.time() < deadline:
+        time.sleep(0.05)
+    assert fields.list_runs()[0]["status"] == "completed"
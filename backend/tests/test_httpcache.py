@@ -0,0 +1,23 @@
+from app import logs, validation
+
+
+def test_manual_get_matching_etag_gets_304(client, manual_input):
+    first = client.get("/api/recommend/manual", query_string=manual_input)
+    assert first.status_code == 200
+    assert "public" in first.headers["Cache-Control"]
+    # A shared cache must not replay one request's ID to other clients
+    assert logs.REQUEST_ID_HEADER not in first.headers
+
+    again = client.get("/api/recommend/manual", query_string=manual_input,
+                       headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_manual_etag_follows_validation_mode(client, manual_input, monkeypatch):
+    flagged = client.get("/api/recommend/manual", query_string=manual_input)
+    monkeypatch.setattr(validation, "VALIDATION_MODE", "reject")
+    rejecting = client.get("/api/recommend/manual", query_string=manual_input,
+                           headers={"If-None-Match": flagged.headers["ETag"]})
+    assert rejecting.status_code == 200
+    assert rejecting.headers["ETag"] != flagged.headers["ETag"]
@@ -0,0 +1,24 @@
+from app import ratelimit
+
+
+def test_live_over_client_rate_gets_429(client, monkeypatch):
+    limiter = ratelimit.ClientLimiter(1, 1)
+    monkeypatch.setattr(ratelimit, "CLIENT_LIMITER", limiter)
+    limiter.try_acquire("127.0.0.1")
+
+    response = client.post("/api/recommend/live", json={"N": 90, "P": 42, "K": 43, "ph": 6.5})
+
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= ratelimit.RETRY_AFTER_MAX_SECONDS
+
+
+def test_forwarded_for_ignored_from_untrusted_peer(monkeypatch):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXIES", ratelimit._parse_networks("10.0.0.0/8"))
+    headers = {"X-Forwarded-For": "1.2.3.4"}
+    assert ratelimit.client_id(headers, "203.0.113.9") == "203.0.113.9"
+    assert ratelimit.client_id({"X-Forwarded-For": "1.2.3.4, 198.51.100.7"}, "10.0.0.2") == "198.51.100.7"
+
+
+def test_retry_after_is_clamped():
+    assert ratelimit.retry_after_header(0.2) == "1"
+    assert ratelimit.retry_after_header(float("inf")) == str(ratelimit.RETRY_AFTER_MAX_SECONDS)
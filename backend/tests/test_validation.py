@@ -0,0 +1,34 @@
+import pytest
+
+from app import validation
+
+# Scored as usual in flag mode, but N is far outside the training range
+OUT_OF_RANGE = {"N": 300, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82.0, "ph": 6.5, "rainfall": 202.9}
+
+
+def test_flag_mode_scores_with_warnings(client, monkeypatch):
+    monkeypatch.setattr(validation, "VALIDATION_MODE", "flag")
+    response = client.post("/api/recommend/manual", json=OUT_OF_RANGE)
+    assert response.status_code == 200
+    assert any("training range" in warning for warning in response.json["warnings"])
+
+
+def test_reject_mode_rejects(client, monkeypatch):
+    monkeypatch.setattr(validation, "VALIDATION_MODE", "reject")
+    response = client.post("/api/recommend/manual", json=OUT_OF_RANGE)
+    assert response.status_code == 400
+    assert "training range" in response.json["error"]
+
+
+@pytest.mark.parametrize("mode", ["flag", "reject"])
+def test_impossible_values_always_rejected(client, manual_input, monkeypatch, mode):
+    monkeypatch.setattr(validation, "VALIDATION_MODE", mode)
+    response = client.post("/api/recommend/manual", json=dict(manual_input, humidity=120))
+    assert response.status_code == 400
+    assert "physical limits" in response.json["error"]
+
+
+def test_margin_stays_within_physical_limits():
+    low, high = validation.bounds.range
+    assert (low >= validation.bounds.physical[0]).all()
+    assert (high <= validation.bounds.physical[1]).all()